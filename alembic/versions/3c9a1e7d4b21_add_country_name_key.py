@@ -0,0 +1,84 @@
+"""Add normalized name_key to country_data
+
+Revision ID: 3c9a1e7d4b21
+Revises: f2b5f22de134
+Create Date: 2025-10-27 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from api.utils.normalize import normalize_name
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1e7d4b21'
+down_revision: Union[str, None] = 'f2b5f22de134'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # The initial migration never created country_data; deployments so far
+    # relied on create_all, so the table may or may not exist yet.
+    if not inspector.has_table('country_data'):
+        op.create_table('country_data',
+        sa.Column('country_id', mysql.CHAR(length=36), nullable=False),
+        sa.Column('country_name', sa.String(length=255), nullable=False),
+        sa.Column('name_key', sa.String(length=255), nullable=False),
+        sa.Column('capital', sa.String(length=255), nullable=True),
+        sa.Column('region', sa.String(length=255), nullable=True),
+        sa.Column('population', sa.Integer(), nullable=False),
+        sa.Column('currency_code', sa.String(length=10), nullable=True),
+        sa.Column('exchange_rate', sa.Float(), nullable=True),
+        sa.Column('estimated_gdp', sa.Float(), nullable=True),
+        sa.Column('flag_url', sa.String(length=512), nullable=True),
+        sa.Column('last_refreshed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('country_id')
+        )
+        op.create_index('ix_country_data_name_key', 'country_data', ['name_key'], unique=True)
+        return
+
+    with op.batch_alter_table('country_data') as batch_op:
+        batch_op.add_column(sa.Column('name_key', sa.String(length=255), nullable=True))
+
+    # --- Backfill keys, dropping rows that normalize to an existing key ---
+    country_data = sa.table(
+        'country_data',
+        sa.column('country_id', sa.String),
+        sa.column('country_name', sa.String),
+        sa.column('name_key', sa.String),
+    )
+    rows = bind.execute(
+        sa.select(country_data.c.country_id, country_data.c.country_name)
+    ).all()
+    seen = set()
+    for country_id, country_name in rows:
+        key = normalize_name(country_name) or country_id
+        if key in seen:
+            bind.execute(
+                country_data.delete().where(country_data.c.country_id == country_id)
+            )
+            continue
+        seen.add(key)
+        bind.execute(
+            country_data.update()
+            .where(country_data.c.country_id == country_id)
+            .values(name_key=key)
+        )
+
+    with op.batch_alter_table('country_data') as batch_op:
+        batch_op.alter_column('name_key', existing_type=sa.String(length=255), nullable=False)
+        batch_op.create_index('ix_country_data_name_key', ['name_key'], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('country_data') as batch_op:
+        batch_op.drop_index('ix_country_data_name_key')
+        batch_op.drop_column('name_key')
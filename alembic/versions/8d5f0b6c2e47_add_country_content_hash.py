@@ -0,0 +1,29 @@
+"""Add content_hash to country_data
+
+Revision ID: 8d5f0b6c2e47
+Revises: 3c9a1e7d4b21
+Create Date: 2025-10-28 14:03:51.672310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d5f0b6c2e47'
+down_revision: Union[str, None] = '3c9a1e7d4b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Left NULL for existing rows; the next refresh fills it in
+    with op.batch_alter_table('country_data') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('country_data') as batch_op:
+        batch_op.drop_column('content_hash')
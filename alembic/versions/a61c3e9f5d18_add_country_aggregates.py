@@ -0,0 +1,110 @@
+"""Add country_aggregates
+
+Revision ID: a61c3e9f5d18
+Revises: 8d5f0b6c2e47
+Create Date: 2025-10-29 10:41:07.215893
+
+"""
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a61c3e9f5d18'
+down_revision: Union[str, None] = '8d5f0b6c2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Tables as they are at this revision; the backfill must not follow later
+# changes to the models or to api.utils.aggregates
+country_data = sa.table(
+    'country_data',
+    sa.column('country_name', sa.String),
+    sa.column('region', sa.String),
+    sa.column('currency_code', sa.String),
+    sa.column('population', sa.Integer),
+    sa.column('estimated_gdp', sa.Float),
+    sa.column('last_refreshed_at', sa.DateTime),
+)
+country_aggregates = sa.table(
+    'country_aggregates',
+    sa.column('dimension', sa.String),
+    sa.column('group_key', sa.String),
+    sa.column('country_count', sa.Integer),
+    sa.column('population_sum', sa.BigInteger),
+    sa.column('gdp_sum', sa.Float),
+    sa.column('top_countries', sa.Text),
+    sa.column('last_refreshed_at', sa.DateTime),
+    sa.column('computed_at', sa.DateTime),
+)
+
+
+def _backfill(connection) -> list[dict]:
+    now = datetime.utcnow()
+    c = country_data.c
+    measures = (
+        sa.func.count(),
+        sa.func.coalesce(sa.func.sum(c.population), 0),
+        sa.func.coalesce(sa.func.sum(c.estimated_gdp), 0.0),
+        sa.func.max(c.last_refreshed_at),
+    )
+
+    count, population, gdp, last_refreshed_at = connection.execute(sa.select(*measures)).one()
+    top = connection.execute(
+        sa.select(c.country_name, c.estimated_gdp)
+        .where(c.estimated_gdp.isnot(None))
+        .order_by(c.estimated_gdp.desc())
+        .limit(5)
+    ).all()
+    rows = [{
+        'dimension': 'total',
+        'group_key': '',
+        'country_count': count,
+        'population_sum': population,
+        'gdp_sum': gdp,
+        'top_countries': json.dumps([[name, value] for name, value in top]),
+        'last_refreshed_at': last_refreshed_at,
+        'computed_at': now,
+    }]
+
+    for dimension, column in (('region', c.region), ('currency', c.currency_code)):
+        group_key = sa.func.coalesce(column, '')
+        grouped = connection.execute(sa.select(group_key, *measures).group_by(group_key))
+        for key, count, population, gdp, last_refreshed_at in grouped:
+            rows.append({
+                'dimension': dimension,
+                'group_key': key,
+                'country_count': count,
+                'population_sum': population,
+                'gdp_sum': gdp,
+                'top_countries': None,
+                'last_refreshed_at': last_refreshed_at,
+                'computed_at': now,
+            })
+    return rows
+
+
+def upgrade() -> None:
+    op.create_table('country_aggregates',
+    sa.Column('dimension', sa.String(length=32), nullable=False),
+    sa.Column('group_key', sa.String(length=255), nullable=False),
+    sa.Column('country_count', sa.Integer(), nullable=False),
+    sa.Column('population_sum', sa.BigInteger(), nullable=False),
+    sa.Column('gdp_sum', sa.Float(), nullable=False),
+    sa.Column('top_countries', sa.Text(), nullable=True),
+    sa.Column('last_refreshed_at', sa.DateTime(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('dimension', 'group_key')
+    )
+
+    # Backfill from the rows already in country_data
+    op.bulk_insert(country_aggregates, _backfill(op.get_bind()))
+
+
+def downgrade() -> None:
+    op.drop_table('country_aggregates')
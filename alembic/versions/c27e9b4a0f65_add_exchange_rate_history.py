@@ -0,0 +1,31 @@
+"""Add exchange_rate_history
+
+Revision ID: c27e9b4a0f65
+Revises: a61c3e9f5d18
+Create Date: 2025-10-30 16:22:48.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c27e9b4a0f65'
+down_revision: Union[str, None] = 'a61c3e9f5d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('exchange_rate_history',
+    sa.Column('currency_code', sa.String(length=10), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('currency_code', 'recorded_at')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('exchange_rate_history')
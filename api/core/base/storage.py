@@ -0,0 +1,15 @@
+from abc import ABC, abstractmethod
+
+
+class Storage(ABC):
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str | None = None):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        pass
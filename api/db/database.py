@@ -1,21 +1,48 @@
-import os
+import asyncio, itertools, logging, os
+from functools import lru_cache
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import column, create_engine, select, table
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from api.utils.metrics import instrument_engine, timed_pool
 
 # Load environment variables
 load_dotenv(".env.config")
 
+logger = logging.getLogger(__name__)
+
+
+# Single tunable pool: request traffic goes through the async engine only
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Pool classes that report checkout wait to /metrics
+SyncPool = timed_pool(NullPool, "sync")
+AsyncPool = timed_pool(AsyncAdaptedQueuePool, "async")
+
+# Optional read replicas: comma-separated URLs in DB_URL form
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# round_robin or least_connections
+DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin").lower()
+# How often each replica's data generation is re-read
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "1"))
+
 
 # ==========================================================
 # 1️⃣  Synchronous Engine (Optional Fallback / Migrations)
 # ==========================================================
+@lru_cache(maxsize=None)
 def get_db_engine():
     """
-    Create a SQLAlchemy synchronous engine for MySQL or SQLite.
-    Useful for migrations or synchronous tasks.
+    Return the SQLAlchemy synchronous engine for MySQL or SQLite, built on
+    first use. Useful for migrations or synchronous tasks. It does not pool
+    connections, so it holds none open between those occasional uses.
     """
     db_type = os.getenv("DB_TYPE", "mysql").lower()
 
@@ -25,8 +52,7 @@ def get_db_engine():
         engine = create_engine(
             database_url,
             connect_args={"check_same_thread": False},
-            pool_size=5,
-            max_overflow=10,
+            poolclass=SyncPool,
         )
     else:
         # Default: MySQL configuration
@@ -40,23 +66,40 @@ def get_db_engine():
 
         engine = create_engine(
             database_url,
-            pool_pre_ping=True,
-            pool_size=10,
-            max_overflow=20,
+            poolclass=SyncPool,
             echo=False,  # set True for debugging
         )
 
+    instrument_engine(engine, "sync")
     return engine
 
 
-db_engine = get_db_engine()
-SessionLocal = sessionmaker(bind=db_engine, autocommit=False, autoflush=False)
+class LazySessionmaker(sessionmaker):
+    """
+    A sessionmaker that binds to its engine when the first session is
+    opened, so importing this module does not build any engine.
+    """
+
+    def __init__(self, engine_factory, **kw):
+        super().__init__(**kw)
+        self.engine_factory = engine_factory
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_factory())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = LazySessionmaker(get_db_engine, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
 def create_database():
-    """Initialize all tables synchronously."""
-    Base.metadata.create_all(bind=db_engine)
+    """
+    Initialize all tables synchronously. The application no longer calls
+    this at startup (run ``alembic upgrade head``); it is kept for scripts.
+    """
+    Base.metadata.create_all(bind=get_db_engine())
 
 
 def get_db():
@@ -71,10 +114,35 @@ def get_db():
 # ==========================================================
 # 2️⃣  Asynchronous Engine (Primary for FastAPI Endpoints)
 # ==========================================================
+@lru_cache(maxsize=None)
 def get_async_engine():
     """
-    Create an asynchronous SQLAlchemy engine for MySQL using aiomysql.
+    Return the asynchronous SQLAlchemy engine for MySQL (aiomysql) or
+    SQLite (aiosqlite), built on first use. This engine owns the
+    application's connection pool, sized by DB_POOL_SIZE / DB_MAX_OVERFLOW.
     """
+    engine = _build_async_engine()
+    instrument_engine(engine.sync_engine, "async")
+    return engine
+
+
+def _build_async_engine():
+    db_type = os.getenv("DB_TYPE", "mysql").lower()
+
+    if db_type == "sqlite":
+        database_url = os.getenv("DB_URL", "sqlite:///./test.db").replace(
+            "sqlite://", "sqlite+aiosqlite://", 1
+        )
+        # aiosqlite defaults to NullPool; pool explicitly like MySQL does
+        return create_async_engine(
+            database_url,
+            echo=False,
+            poolclass=AsyncPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+
     user = os.getenv("DB_USER", "root")
     password = os.getenv("DB_PASSWORD", "")
     host = os.getenv("DB_HOST", "localhost")
@@ -87,15 +155,188 @@ def get_async_engine():
         database_url,
         echo=False,
         pool_pre_ping=True,
-        pool_size=10,
-        max_overflow=20,
+        poolclass=AsyncPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
     )
 
 
-# Instantiate global async engine and session factory
-async_engine = get_async_engine()
-AsyncSessionLocal = sessionmaker(
-    bind=async_engine,
+# ==========================================================
+# 3️⃣  Read Replicas (Optional, DB_REPLICA_URLS)
+# ==========================================================
+class Replica:
+    """
+    One read replica and the data generation last seen on it. A replica
+    is only read from once it has caught up with the newest generation
+    this worker knows about, so reads never go back in time.
+    """
+
+    __slots__ = ("name", "engine", "generation")
+
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.generation = None
+
+
+def _async_url(url: str):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if backend == "mysql":
+        return url.set(drivername="mysql+aiomysql")
+    return url
+
+
+@lru_cache(maxsize=None)
+def get_replicas() -> tuple[Replica, ...]:
+    replicas = []
+    for index, url in enumerate(DB_REPLICA_URLS):
+        name = f"replica{index}"
+        async_url = _async_url(url)
+        options = {"pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True}
+        if async_url.get_backend_name() == "sqlite":
+            options = {}
+        engine = create_async_engine(
+            async_url,
+            echo=False,
+            poolclass=timed_pool(AsyncAdaptedQueuePool, name),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            **options,
+        )
+        instrument_engine(engine.sync_engine, name)
+        replicas.append(Replica(name, engine))
+    return tuple(replicas)
+
+
+# Newest generation this worker has seen on the primary
+_known_generation: int | None = None
+_round_robin = itertools.count()
+
+
+def note_generation(generation: int):
+    """
+    Record a generation read from, or committed to, the primary. Replicas
+    behind it stop receiving reads until they catch up.
+    """
+    global _known_generation
+    if _known_generation is None or generation > _known_generation:
+        _known_generation = generation
+
+
+def known_generation() -> int | None:
+    return _known_generation
+
+
+def pick_replica() -> Replica | None:
+    """
+    A replica that has caught up with the known generation, or None to
+    read from the primary.
+    """
+    if _known_generation is None:
+        return None
+    ready = [
+        replica
+        for replica in get_replicas()
+        if replica.generation is not None and replica.generation >= _known_generation
+    ]
+    if not ready:
+        return None
+    if DB_REPLICA_STRATEGY == "least_connections":
+        return min(ready, key=lambda replica: replica.engine.sync_engine.pool.checkedout())
+    return ready[next(_round_robin) % len(ready)]
+
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to an up-to-date replica and everything else to
+    the primary. Once a session flushes or writes it stays on the primary,
+    so it reads its own writes. Pass ``bind_arguments={"use_primary": True}``
+    to force a read onto the primary.
+    """
+
+    _on_primary = False
+
+    def get_bind(self, mapper=None, clause=None, use_primary=False, **kw):
+        primary = super().get_bind(mapper, clause=clause, **kw)
+        if self._on_primary or use_primary:
+            return primary
+        if self._flushing or (clause is not None and clause.is_dml):
+            self._on_primary = True
+            return primary
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return primary
+
+        replica = pick_replica()
+        return replica.engine.sync_engine if replica else primary
+
+
+_system_meta = table("system_meta", column("key"), column("value"))
+
+
+async def check_replicas():
+    """
+    Re-read the data generation on every replica. A replica that cannot
+    be reached is taken out of rotation until it answers again.
+    """
+    for replica in get_replicas():
+        try:
+            async with replica.engine.connect() as connection:
+                value = await connection.scalar(
+                    select(_system_meta.c.value).where(_system_meta.c.key == "cache_generation")
+                )
+            replica.generation = int(value) if value else 0
+        except Exception:
+            if replica.generation is not None:
+                logger.warning("Replica %s is unreachable; reading from the primary", replica.name)
+            replica.generation = None
+
+
+async def run_replica_monitor():
+    while True:
+        await check_replicas()
+        await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+
+
+def start_replica_monitor() -> asyncio.Task | None:
+    """
+    Start tracking replica generations; returns None without replicas.
+    """
+    if not get_replicas():
+        return None
+    return asyncio.create_task(run_replica_monitor())
+
+
+async def dispose_engines():
+    """
+    Close the pooled connections of the async engine and every replica
+    engine, for shutdown. Engines that were never built are left alone.
+    """
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_replicas.cache_info().currsize:
+        for replica in get_replicas():
+            await replica.engine.dispose()
+
+
+# Session factories; the engine behind them is built by the first session.
+# Request reads may go to replicas; jobs that must see the latest state use
+# PrimarySessionLocal.
+AsyncSessionLocal = LazySessionmaker(
+    get_async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession if DB_REPLICA_URLS else Session,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False,
+)
+PrimarySessionLocal = LazySessionmaker(
+    get_async_engine,
     class_=AsyncSession,
     expire_on_commit=False,
     autoflush=False,
@@ -110,3 +351,12 @@ async def get_async_db():
     """
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def __getattr__(name):
+    # ``db_engine`` and ``async_engine`` used to be module globals
+    if name == "db_engine":
+        return get_db_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.models.country_data import CountryData
+from api.v1.models.country_aggregate import CountryAggregate
+from api.v1.models.system_meta import SystemMeta
+
+
+# Countries kept in the total row, and shown on the summary image
+SUMMARY_TOP_N = 5
+
+# Dimensions served by /countries/stats, mapped to the grouped column
+GROUP_BY_COLUMNS = {
+    "region": CountryData.region,
+    "currency": CountryData.currency_code,
+}
+
+TOTAL_DIMENSION = "total"
+
+# SystemMeta row stamped by every successful refresh, whether or not it
+# changed any row
+STATUS_KEY = "global_status"
+
+
+def _refreshed_at(session: Session) -> datetime | None:
+    # Unchanged rows are not rewritten, so their own timestamps lag behind
+    meta = session.get(SystemMeta, STATUS_KEY)
+    return meta.last_refreshed_at if meta else None
+
+
+def rebuild_aggregates(session: Session) -> None:
+    """
+    Recompute every aggregate row from country_data inside the caller's
+    transaction, so readers see totals that match the rows they describe.
+
+    Works on a synchronous Session; from async code use
+    ``await async_session.run_sync(rebuild_aggregates)``.
+    """
+    now = datetime.utcnow()
+    refreshed_at = _refreshed_at(session)
+    measures = (
+        func.count(CountryData.country_id),
+        func.coalesce(func.sum(CountryData.population), 0),
+        func.coalesce(func.sum(CountryData.estimated_gdp), 0.0),
+        func.max(CountryData.last_refreshed_at),
+    )
+
+    rows = []
+    count, population, gdp, last_refreshed_at = session.execute(select(*measures)).one()
+    top = session.execute(
+        select(CountryData.country_name, CountryData.estimated_gdp)
+        .where(CountryData.estimated_gdp.isnot(None))
+        .order_by(CountryData.estimated_gdp.desc())
+        .limit(SUMMARY_TOP_N)
+    ).all()
+    rows.append(
+        {
+            "dimension": TOTAL_DIMENSION,
+            "group_key": "",
+            "country_count": count,
+            "population_sum": population,
+            "gdp_sum": gdp,
+            "top_countries": json.dumps([[name, value] for name, value in top]),
+            "last_refreshed_at": refreshed_at or last_refreshed_at,
+            "computed_at": now,
+        }
+    )
+
+    for dimension, column in GROUP_BY_COLUMNS.items():
+        # Primary key columns cannot be NULL, so NULL and "" form one group
+        group_key = func.coalesce(column, "")
+        grouped = session.execute(select(group_key, *measures).group_by(group_key))
+        for key, count, population, gdp, last_refreshed_at in grouped:
+            rows.append(
+                {
+                    "dimension": dimension,
+                    "group_key": key,
+                    "country_count": count,
+                    "population_sum": population,
+                    "gdp_sum": gdp,
+                    "top_countries": None,
+                    "last_refreshed_at": refreshed_at or last_refreshed_at,
+                    "computed_at": now,
+                }
+            )
+
+    session.execute(delete(CountryAggregate))
+    session.execute(insert(CountryAggregate), rows)
+
+
+def touch_aggregates(session: Session) -> None:
+    """
+    Stamp every aggregate row with the latest refresh time, for a refresh
+    that found nothing to write.
+    """
+    session.execute(
+        update(CountryAggregate).values(last_refreshed_at=_refreshed_at(session))
+    )
+
+
+def aggregate_to_dict(aggregate: CountryAggregate) -> dict:
+    return {
+        "key": aggregate.group_key or None,
+        "country_count": aggregate.country_count,
+        "population_sum": aggregate.population_sum,
+        "gdp_sum": round(aggregate.gdp_sum, 1),
+        "last_refreshed_at": aggregate.last_refreshed_at,
+    }
+
+
+async def read_total(db: AsyncSession) -> CountryAggregate | None:
+    """
+    Primary-key read of the total row.
+    """
+    return await db.get(CountryAggregate, (TOTAL_DIMENSION, ""), populate_existing=True)
+
+
+async def read_group(db: AsyncSession, dimension: str) -> list[CountryAggregate]:
+    result = await db.execute(
+        select(CountryAggregate)
+        .where(CountryAggregate.dimension == dimension)
+        .order_by(CountryAggregate.group_key)
+    )
+    return list(result.scalars())
+
+
+def summary_from_total(total: CountryAggregate | None) -> dict:
+    """
+    The figures drawn on the summary image, taken from the total row.
+    """
+    if total is None:
+        return {
+            "total_countries": 0,
+            "top_countries": [],
+            "last_refreshed_at": datetime.utcnow(),
+        }
+    return {
+        "total_countries": total.country_count,
+        "top_countries": [tuple(item) for item in json.loads(total.top_countries or "[]")],
+        "last_refreshed_at": total.last_refreshed_at or datetime.utcnow(),
+    }
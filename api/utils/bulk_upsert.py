@@ -0,0 +1,162 @@
+import hashlib, json, math, uuid
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from api.v1.models.country_data import CountryData
+from api.utils.normalize import normalize_name
+
+
+# Columns written from the enriched upstream payload
+UPSERT_COLUMNS = (
+    "country_name",
+    "capital",
+    "region",
+    "population",
+    "currency_code",
+    "exchange_rate",
+    "estimated_gdp",
+    "flag_url",
+)
+
+# Source fields covered by content_hash. estimated_gdp is re-drawn on every
+# transform, so it is left out: a row keeps its estimate until its inputs change.
+HASHED_COLUMNS = tuple(col for col in UPSERT_COLUMNS if col != "estimated_gdp")
+
+# Rows per INSERT statement; keeps bound parameters well below driver limits
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _values_differ(current, new) -> bool:
+    if current is None or new is None:
+        return current is not new
+    if isinstance(current, float) or isinstance(new, float):
+        # MySQL FLOAT columns are single precision, so compare loosely
+        return not math.isclose(float(current), float(new), rel_tol=1e-6)
+    return current != new
+
+
+def row_content_hash(values: dict) -> str:
+    """
+    Stable digest of a row's source fields, stored in ``content_hash``.
+    """
+    payload = json.dumps([values.get(col) for col in HASHED_COLUMNS], separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _row_changed(existing: dict, values: dict) -> bool:
+    return any(_values_differ(existing[col], values[col]) for col in UPSERT_COLUMNS)
+
+
+def _upsert_statement(dialect_name: str, table, rows: list[dict]):
+    """
+    Build a single multi-row INSERT that updates on a name_key collision,
+    using the native upsert syntax of the connected dialect.
+    """
+    update_columns = UPSERT_COLUMNS + ("content_hash", "last_refreshed_at")
+
+    if dialect_name == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(
+            {col: stmt.inserted[col] for col in update_columns}
+        )
+
+    if dialect_name in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.name_key],
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+
+    raise ValueError(f"Bulk upsert is not supported for dialect '{dialect_name}'.")
+
+
+def bulk_upsert_countries(
+    session: Session,
+    rows: list[dict],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    rewrite_gdp: bool = False,
+) -> dict:
+    """
+    Insert or update a batch of enriched country rows in a few set-based
+    statements, keyed on the normalized country name.
+
+    Existing rows are read with one SELECT per chunk and compared by content
+    hash, falling back to a column diff for rows written before the hash
+    existed, so unchanged rows are never written. With ``rewrite_gdp``,
+    rows whose estimated_gdp differs are written too, so every stored
+    estimate comes from this batch. Returns the inserted, updated and
+    unchanged counts. The caller owns the transaction.
+
+    Works on a synchronous Session; from async code use
+    ``await async_session.run_sync(bulk_upsert_countries, rows)``.
+    """
+    table = CountryData.__table__
+
+    # --- Deduplicate the batch on its normalized key (last one wins) ---
+    batch = {}
+    for row in rows:
+        key = normalize_name(row.get("country_name"))
+        if not key:
+            continue
+        batch[key] = {col: row.get(col) for col in UPSERT_COLUMNS}
+
+    # --- Load the current state of every key in the batch ---
+    existing = {}
+    lookup_columns = [table.c.name_key, table.c.content_hash] + [
+        table.c[col] for col in UPSERT_COLUMNS
+    ]
+    for keys in _chunks(list(batch), chunk_size):
+        result = session.execute(
+            select(*lookup_columns).where(table.c.name_key.in_(keys))
+        )
+        for record in result.mappings():
+            existing[record["name_key"]] = record
+
+    # --- Diff the batch against the stored rows ---
+    now = datetime.utcnow()
+    inserted = updated = unchanged = 0
+    pending = []
+    for key, values in batch.items():
+        content_hash = row_content_hash(values)
+        current = existing.get(key)
+        if current is None:
+            inserted += 1
+        elif current["content_hash"] == content_hash:
+            if not rewrite_gdp or not _values_differ(
+                current["estimated_gdp"], values["estimated_gdp"]
+            ):
+                unchanged += 1
+                continue
+            updated += 1
+        elif current["content_hash"] is None and not _row_changed(current, values):
+            # Pre-hash row with identical data; write only to store the hash
+            unchanged += 1
+        else:
+            updated += 1
+
+        # country_id is only used when the row is new; on conflict it is kept
+        pending.append(
+            {
+                "country_id": str(uuid.uuid4()),
+                "name_key": key,
+                **values,
+                "content_hash": content_hash,
+                "last_refreshed_at": now,
+            }
+        )
+
+    # --- Write inserts and updates together ---
+    dialect_name = session.get_bind().dialect.name
+    for chunk in _chunks(pending, chunk_size):
+        session.execute(_upsert_statement(dialect_name, table, chunk))
+
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
@@ -0,0 +1,232 @@
+import asyncio, importlib.util, os, uuid, zlib
+from functools import lru_cache
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from api.utils.metrics import COMPRESSIONS
+
+
+load_dotenv(".env.config")
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Smaller bodies are sent as they are
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Preferred first when the client accepts several equally
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",")
+    if encoding.strip()
+]
+
+# Bodies compressed once and kept (cache entries, export files) can afford
+# a higher level than bodies compressed for a single response. Brotli stays
+# at 5: above that each compression holds a 20+ MiB window for little gain
+PRECOMPRESS_LEVELS = {"gzip": 9, "br": 5, "zstd": 12}
+DYNAMIC_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+
+# encoding -> module it needs (brotli and zstandard are optional)
+_ENCODING_MODULES = {"gzip": "zlib", "br": "brotli", "zstd": "zstandard"}
+_FILE_SUFFIXES = {"gzip": "gz", "br": "br", "zstd": "zst"}
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+@lru_cache(maxsize=None)
+def available_encodings() -> tuple[str, ...]:
+    return tuple(
+        encoding
+        for encoding in COMPRESSION_ENCODINGS
+        if encoding in _ENCODING_MODULES
+        and importlib.util.find_spec(_ENCODING_MODULES[encoding]) is not None
+    )
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """
+    The encoding to answer with for an Accept-Encoding header, or None
+    for identity. Highest q-value wins; ties go to COMPRESSION_ENCODINGS order.
+    """
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(media_type: str | None, size: int | None = None) -> bool:
+    if not media_type or not media_type.startswith(_COMPRESSIBLE_TYPES):
+        return False
+    return size is None or size >= COMPRESSION_MIN_BYTES
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    """
+    Encoded bodies are different representations, so each gets its own
+    strong ETag: ``"abc"`` becomes ``"abc-gzip"``.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class _Compressor:
+    """
+    Incremental compressor with one interface over zlib, brotli and zstandard.
+    """
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "gzip":
+            self._stream = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress, self._finish = self._stream.compress, self._stream.flush
+        elif encoding == "br":
+            import brotli
+
+            self._stream = brotli.Compressor(quality=level)
+            self.compress, self._finish = self._stream.process, self._stream.finish
+        else:
+            import zstandard
+
+            self._stream = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress, self._finish = self._stream.compress, self._stream.flush
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def compress(data: bytes, encoding: str, precompressed: bool = False) -> bytes:
+    levels = PRECOMPRESS_LEVELS if precompressed else DYNAMIC_LEVELS
+    compressor = _Compressor(encoding, levels[encoding])
+    COMPRESSIONS.labels(encoding, "precompressed" if precompressed else "dynamic").inc()
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compress_file(path: str, target: str, encoding: str, chunk_size: int = 1024 * 1024):
+    compressor = _Compressor(encoding, PRECOMPRESS_LEVELS[encoding])
+    COMPRESSIONS.labels(encoding, "precompressed").inc()
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(path, "rb") as source, open(tmp_path, "wb") as out:
+            while chunk := source.read(chunk_size):
+                out.write(compressor.compress(chunk))
+            out.write(compressor.finish())
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Files being compressed, so concurrent requests share one
+_compressing: dict[str, asyncio.Task] = {}
+
+
+async def compressed_file(path: str, encoding: str) -> str:
+    """
+    Path of ``path`` compressed with ``encoding``, written next to it on
+    first request and reused until the original is removed.
+    """
+    target = f"{path}.{_FILE_SUFFIXES[encoding]}"
+    if not os.path.isfile(target):
+        task = _compressing.get(target)
+        if task is None:
+            task = asyncio.create_task(run_in_threadpool(_compress_file, path, target, encoding))
+            _compressing[target] = task
+            task.add_done_callback(lambda _: _compressing.pop(target, None))
+        await asyncio.shield(task)
+    return target
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing dynamic responses to whichever
+    encoding the client prefers. Responses that already carry a
+    Content-Encoding (precompressed cache entries and files) pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if (
+                    start_message["status"] != 200
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                    or (not more_body and len(body) < COMPRESSION_MIN_BYTES)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    # Compression levels may change; the bytes are not stable
+                    headers["ETag"] = "W/" + headers["etag"]
+
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                del headers["Content-Length"]
+                compressor = _Compressor(encoding, DYNAMIC_LEVELS[encoding])
+                COMPRESSIONS.labels(encoding, "dynamic").inc()
+                await send(start_message)
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,191 @@
+import asyncio, csv, hashlib, importlib.util, os, shutil, time, uuid
+from fastapi.concurrency import run_in_threadpool
+from api.utils.country_query import STREAM_CHUNK_SIZE
+from api.utils.country_snapshot import CountrySnapshot
+from api.utils.storage import local_storage
+
+
+EXPORT_PREFIX = "exports"
+# Rows per Parquet row group / Arrow record batch
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+# Older exports stay this long after their last write, for downloads in
+# progress and workers still serving an earlier generation
+EXPORT_GRACE_SECONDS = float(os.getenv("EXPORT_GRACE_SECONDS", "300"))
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+}
+# Written with pyarrow, which is optional
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+class CountryExport:
+    __slots__ = ("path", "etag", "media_type", "filename")
+
+    def __init__(self, path: str, etag: str, media_type: str, filename: str):
+        self.path = path
+        self.etag = etag
+        self.media_type = media_type
+        self.filename = filename
+
+
+def columnar_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _fields_digest(fields: list[str]) -> str:
+    return hashlib.blake2b(",".join(fields).encode(), digest_size=6).hexdigest()
+
+
+def export_etag(generation: int, export_format: str, fields: list[str]) -> str:
+    """
+    Exports are a pure function of the data generation and the request,
+    so the ETag is known before anything is read or written.
+    """
+    return f'"export-{generation}-{_fields_digest(fields)}-{export_format}"'
+
+
+def export_key(generation: int, export_format: str, fields: list[str]) -> str:
+    extension = EXPORT_FORMATS[export_format][1]
+    return f"{EXPORT_PREFIX}/{generation}/countries-{_fields_digest(fields)}.{extension}"
+
+
+def _batches(snapshot: CountrySnapshot, size: int):
+    order = snapshot.orderings["name"]
+    for start in range(0, len(order), size):
+        yield order[start : start + size]
+
+
+# --- Writers: run in the threadpool, one batch of rows in memory at a time ---
+
+
+def _write_csv(snapshot: CountrySnapshot, fields: list[str], path: str):
+    # Only the timestamp needs converting; csv formats the rest itself
+    timestamp = fields.index("last_refreshed_at") if "last_refreshed_at" in fields else None
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        for batch in _batches(snapshot, STREAM_CHUNK_SIZE):
+            rows = [[snapshot.rows[p][f] for f in fields] for p in batch]
+            if timestamp is not None:
+                for row in rows:
+                    if row[timestamp] is not None:
+                        row[timestamp] = row[timestamp].isoformat()
+            writer.writerows(rows)
+
+
+def _write_ndjson(snapshot: CountrySnapshot, fields: list[str], path: str):
+    with open(path, "wb") as out:
+        for batch in _batches(snapshot, STREAM_CHUNK_SIZE):
+            out.write(snapshot.serialize(list(batch), fields, "ndjson"))
+
+
+def _arrow_schema(fields: list[str]):
+    import pyarrow as pa
+
+    types = {
+        "population": pa.int64(),
+        "exchange_rate": pa.float64(),
+        "estimated_gdp": pa.float64(),
+        "last_refreshed_at": pa.timestamp("us"),
+    }
+    return pa.schema([(f, types.get(f, pa.string())) for f in fields])
+
+
+def _write_columnar(snapshot: CountrySnapshot, fields: list[str], path: str, export_format: str):
+    import pyarrow as pa
+
+    schema = _arrow_schema(fields)
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    with writer:
+        for batch in _batches(snapshot, EXPORT_BATCH_ROWS):
+            rows = [snapshot.rows[p] for p in batch]
+            writer.write_batch(
+                pa.record_batch(
+                    [pa.array([row[f] for row in rows], schema.field(f).type) for f in fields],
+                    schema=schema,
+                )
+            )
+
+
+def write_export(snapshot: CountrySnapshot, fields: list[str], export_format: str, path: str):
+    """
+    Write the snapshot to ``path`` in ``export_format``, ordered by name.
+    Goes through a temporary file so readers never see a partial export.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if export_format == "csv":
+            _write_csv(snapshot, fields, tmp_path)
+        elif export_format == "ndjson":
+            _write_ndjson(snapshot, fields, tmp_path)
+        else:
+            _write_columnar(snapshot, fields, tmp_path, export_format)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _prune_generations(current: int):
+    """
+    Remove the exports of generations before ``current``, except those of
+    the one just before it and any written within EXPORT_GRACE_SECONDS.
+    """
+    root = local_storage.path_for(EXPORT_PREFIX)
+    if not root.is_dir():
+        return
+    older = sorted(
+        (child for child in root.iterdir() if child.is_dir() and child.name.isdigit()),
+        key=lambda child: int(child.name),
+    )
+    older = [child for child in older if int(child.name) < current]
+    cutoff = time.time() - EXPORT_GRACE_SECONDS
+    for child in older[:-1]:
+        if child.stat().st_mtime < cutoff:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+# Exports being written, so concurrent requests share one
+_building: dict[str, asyncio.Task] = {}
+
+
+async def _build(snapshot: CountrySnapshot, fields: list[str], export_format: str, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    await run_in_threadpool(write_export, snapshot, fields, export_format, str(path))
+    # Exports of older generations are no longer written to
+    await run_in_threadpool(_prune_generations, snapshot.generation)
+
+
+async def get_export(snapshot: CountrySnapshot, export_format: str, fields: list[str]) -> CountryExport:
+    """
+    The export of ``snapshot`` in ``export_format``, written once per data
+    generation and served from the local cache afterwards.
+    """
+    key = export_key(snapshot.generation, export_format, fields)
+    path = local_storage.path_for(key)
+
+    if not path.is_file():
+        task = _building.get(key)
+        if task is None:
+            task = asyncio.create_task(_build(snapshot, fields, export_format, path))
+            _building[key] = task
+            task.add_done_callback(lambda _: _building.pop(key, None))
+        await asyncio.shield(task)
+
+    return CountryExport(
+        str(path),
+        export_etag(snapshot.generation, export_format, fields),
+        EXPORT_FORMATS[export_format][0],
+        f"countries-{snapshot.generation}.{EXPORT_FORMATS[export_format][1]}",
+    )
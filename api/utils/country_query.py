@@ -0,0 +1,119 @@
+import base64, json, orjson
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from api.v1.models.country_data import CountryData
+
+
+# Public field name -> column, in response order
+COUNTRY_FIELDS = {
+    "id": CountryData.country_id,
+    "name": CountryData.country_name,
+    "capital": CountryData.capital,
+    "region": CountryData.region,
+    "population": CountryData.population,
+    "currency_code": CountryData.currency_code,
+    "exchange_rate": CountryData.exchange_rate,
+    "estimated_gdp": CountryData.estimated_gdp,
+    "flag_url": CountryData.flag_url,
+    "last_refreshed_at": CountryData.last_refreshed_at,
+}
+
+# GDP is never negative, so NULLs sort first ascending and last descending,
+# matching what MySQL and SQLite do natively while keeping the key non-null.
+GDP_SORT_KEY = func.coalesce(CountryData.estimated_gdp, -1.0)
+
+# sort parameter -> (sort key expression, descending). Names sort on the
+# case- and accent-folded name_key, as MySQL's default collation orders them.
+SORT_KEYS = {
+    "name": (CountryData.name_key, False),
+    "gdp_asc": (GDP_SORT_KEY, False),
+    "gdp_desc": (GDP_SORT_KEY, True),
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# Rows encoded per batch when writing a full export
+STREAM_CHUNK_SIZE = 500
+
+
+def parse_fields(fields: str | None) -> list[str]:
+    """
+    Parse a comma-separated ``fields=`` projection into public field names.
+    Raises HTTPException(400) for unknown fields.
+    """
+    if not fields:
+        return list(COUNTRY_FIELDS)
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in COUNTRY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "Unknown fields requested",
+                "details": f"Unknown: {', '.join(unknown)}. "
+                f"Allowed: {', '.join(COUNTRY_FIELDS)}",
+            },
+        )
+    # Preserve response order and drop duplicates
+    return [f for f in COUNTRY_FIELDS if f in requested]
+
+
+def resolve_sort(sort: str | None) -> str:
+    """
+    Map the ``sort`` query parameter onto a known sort name; anything
+    unrecognised falls back to name ordering as before.
+    """
+    return sort if sort in SORT_KEYS else "name"
+
+
+def encode_cursor(sort_name: str, key_value, country_id: str) -> str:
+    payload = json.dumps([sort_name, key_value, country_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_name: str) -> tuple:
+    """
+    Decode an opaque cursor back into (sort key value, country id).
+    Raises HTTPException(400) if it is malformed, holds values of the wrong
+    type for ``sort_name`` or was issued for a different sort order.
+    """
+    invalid = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail={"error": "Invalid cursor", "details": "Cursor could not be decoded."},
+    )
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key_value, country_id = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+    except Exception:
+        raise invalid
+
+    if cursor_sort != sort_name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "Invalid cursor",
+                "details": f"Cursor was issued for sort '{cursor_sort}', not '{sort_name}'.",
+            },
+        )
+
+    # The key is compared against the sort keys, so its type must match them
+    key_type = str if sort_name == "name" else (int, float)
+    if (
+        not isinstance(key_value, key_type)
+        or isinstance(key_value, bool)
+        or not isinstance(country_id, str)
+    ):
+        raise invalid
+    return key_value, country_id
+
+
+def dumps(value) -> bytes:
+    """
+    Serialize to compact JSON bytes; datetimes become ISO 8601 strings.
+    """
+    return orjson.dumps(value)
+
@@ -0,0 +1,209 @@
+import asyncio, bisect
+from array import array
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.db.database import AsyncSessionLocal
+from api.v1.models.country_data import CountryData
+from api.utils.country_query import COUNTRY_FIELDS, decode_cursor, dumps, encode_cursor
+from api.utils.rate_history import RateMatrix, load_rate_matrix
+from api.utils.response_cache import current_generation
+
+
+def _gdp_sort_key(gdp) -> float:
+    # Mirrors GDP_SORT_KEY in country_query: NULL sorts as -1
+    return -1.0 if gdp is None else gdp
+
+
+class CountrySnapshot:
+    """
+    Immutable, read-only copy of country_data for one data generation.
+
+    Rows are response-ready dicts keyed by ``COUNTRY_FIELDS``; indexes and
+    orderings hold row positions in compact integer arrays. A new snapshot is built
+    on every generation change and swapped in by reference, so readers
+    never see a half-built one.
+    """
+
+    __slots__ = (
+        "generation",
+        "rows",
+        "row_json",
+        "by_name_key",
+        "by_region",
+        "by_currency",
+        "orderings",
+        "sort_keys",
+        "rates",
+    )
+
+    def __init__(self, records: list, generation: int | None = None, rates: RateMatrix | None = None):
+        """
+        ``records`` are (name_key, *COUNTRY_FIELDS values) tuples.
+        """
+        self.generation = generation
+        self.rates = rates or RateMatrix({})
+        fields = list(COUNTRY_FIELDS)
+        # Rows are built and serialized once per generation, not per request
+        self.rows = tuple(dict(zip(fields, record[1:])) for record in records)
+        self.row_json = tuple(dumps(row) for row in self.rows)
+
+        by_name_key, by_region, by_currency = {}, {}, {}
+        for position, record in enumerate(records):
+            row = self.rows[position]
+            by_name_key[record[0]] = position
+            by_region.setdefault((row["region"] or "").lower(), array("I")).append(position)
+            by_currency.setdefault(row["currency_code"], array("I")).append(position)
+        self.by_name_key = by_name_key
+        self.by_region = by_region
+        self.by_currency = by_currency
+
+        # Ascending (sort key, id) per sort; descending sorts walk them backwards.
+        # Names sort on name_key, like the database collation does.
+        sort_values = {
+            "name": [(record[0], row["id"]) for record, row in zip(records, self.rows)],
+            "gdp": [(_gdp_sort_key(row["estimated_gdp"]), row["id"]) for row in self.rows],
+        }
+        self.orderings = {}
+        self.sort_keys = {}
+        for name, values in sort_values.items():
+            order = sorted(range(len(self.rows)), key=values.__getitem__)
+            self.orderings[name] = array("I", order)
+            self.sort_keys[name] = [values[p] for p in order]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def position_of(self, name_key: str) -> int | None:
+        return self.by_name_key.get(name_key)
+
+    def _converted(self, position: int, fields: list[str], base_rate: float) -> dict:
+        row = {f: self.rows[position][f] for f in fields}
+        if row.get("estimated_gdp") is not None:
+            row["estimated_gdp"] = round(row["estimated_gdp"] * base_rate, 1)
+        if row.get("exchange_rate") is not None:
+            # Local currency per unit of the base currency
+            row["exchange_rate"] = row["exchange_rate"] / base_rate
+        return row
+
+    def serialize(
+        self,
+        positions: list[int],
+        fields: list[str],
+        output_format: str = "json",
+        base: str = "USD",
+    ) -> bytes:
+        """
+        Encode rows as a JSON array or NDJSON. Full USD rows reuse their
+        pre-serialized bytes; projections and other ``base`` currencies,
+        converted through the rate matrix, are encoded on the fly.
+        """
+        if base != "USD":
+            base_rate = self.rates.rate(base)
+            items = [dumps(self._converted(p, fields, base_rate)) for p in positions]
+        elif len(fields) == len(COUNTRY_FIELDS):
+            items = [self.row_json[p] for p in positions]
+        else:
+            items = [dumps({f: self.rows[p][f] for f in fields}) for p in positions]
+
+        if output_format == "ndjson":
+            return b"".join(item + b"\n" for item in items)
+        return b"[" + b",".join(items) + b"]"
+
+    def _allowed(self, region: str | None, currency: str | None) -> set | None:
+        """
+        Positions passing the filters, or None when nothing is filtered.
+        Region is a case-insensitive substring match, as in the SQL query.
+        """
+        allowed = None
+        if region:
+            needle = region.lower()
+            allowed = set()
+            for key, positions in self.by_region.items():
+                if needle in key:
+                    allowed.update(positions)
+        if currency:
+            positions = set(self.by_currency.get(currency, ()))
+            allowed = positions if allowed is None else allowed & positions
+        return allowed
+
+    def query(
+        self,
+        region: str | None = None,
+        currency: str | None = None,
+        sort_name: str = "name",
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[int], str | None]:
+        """
+        Filter, sort and keyset-paginate in memory. Returns the matching
+        row positions and the next cursor, if there is more.
+        """
+        ordering_name = "name" if sort_name == "name" else "gdp"
+        descending = sort_name == "gdp_desc"
+        order = self.orderings[ordering_name]
+        keys = self.sort_keys[ordering_name]
+
+        start, stop = 0, len(order)
+        if cursor:
+            key_value, country_id = decode_cursor(cursor, sort_name)
+            after = (key_value, country_id)
+            if descending:
+                stop = bisect.bisect_left(keys, after)
+            else:
+                start = bisect.bisect_right(keys, after)
+
+        positions = range(stop - 1, start - 1, -1) if descending else range(start, stop)
+        allowed = self._allowed(region, currency)
+
+        matched = []
+        for index in positions:
+            if allowed is not None and order[index] not in allowed:
+                continue
+            if limit is not None and len(matched) == limit:
+                next_cursor = encode_cursor(sort_name, *keys[matched[-1]])
+                return [order[i] for i in matched], next_cursor
+            matched.append(index)
+
+        return [order[i] for i in matched], None
+
+
+async def load_snapshot(db: AsyncSession, generation: int | None = None) -> CountrySnapshot:
+    result = await db.execute(
+        select(CountryData.name_key, *COUNTRY_FIELDS.values())
+    )
+    return CountrySnapshot(result.all(), generation, await load_rate_matrix(db))
+
+
+_snapshot = CountrySnapshot([])
+_lock = asyncio.Lock()
+
+
+def current_snapshot() -> CountrySnapshot:
+    """
+    The most recently loaded snapshot, without checking the generation.
+    """
+    return _snapshot
+
+
+async def get_snapshot(db: AsyncSession, generation: int) -> CountrySnapshot:
+    """
+    Return the snapshot for ``generation``, reloading it from the database
+    when a refresh or delete has moved the generation on.
+    """
+    global _snapshot
+
+    if _snapshot.generation == generation:
+        return _snapshot
+
+    async with _lock:
+        if _snapshot.generation != generation:
+            _snapshot = await load_snapshot(db, generation)
+        return _snapshot
+
+
+async def warm_snapshot():
+    """
+    Load the snapshot at startup so the first request does not pay for it.
+    """
+    async with AsyncSessionLocal() as db:
+        await get_snapshot(db, await current_generation(db))
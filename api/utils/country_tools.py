@@ -1,366 +1,212 @@
-import dropbox.exceptions
-import dropbox.files
-from api.v1.models.country_data import CountryData
 from fastapi import HTTPException, status
 from dotenv import load_dotenv
 from api.v1.models.system_meta import SystemMeta
-from PIL import Image, ImageDraw, ImageFont
-import random, requests, io, httpx, dropbox, os, asyncio
+from api.utils.aggregates import (
+    STATUS_KEY,
+    read_total,
+    rebuild_aggregates,
+    summary_from_total,
+    touch_aggregates,
+)
+from api.utils.bulk_upsert import bulk_upsert_countries
+from api.utils.flag_assets import schedule_flag_sync
+from api.utils.rate_history import append_rate_history, rate_history_rows
+from api.utils.response_cache import bump_generation, response_cache
+from api.utils.http_client import get_with_retry, hedged_get
+from api.utils.metrics import observe_stage
+from api.utils.summary_image import render_summary, schedule_summary_render
+from api.utils.upstream import (
+    COUNTRIES_URL,
+    EXCHANGE_URL,
+    UpstreamDocument,
+    applied_digests,
+    fetch_document,
+    load_applied,
+    load_validators,
+    save_applied,
+    save_snapshot,
+    save_validators,
+)
+import httpx, os, asyncio, time
 from datetime import datetime
-from sqlalchemy import func, select
-from fastapi.concurrency import run_in_threadpool
 
 
 load_dotenv(".env.config")
 
-DROPBOX_ACCESS_TOKEN = os.getenv("DROPBOX_TOKEN")
-DROPBOX_PATH = "/cache/summary.png"
-dbx = dropbox.Dropbox(DROPBOX_ACCESS_TOKEN)
 
-
-async def fetch_exchange_rate(base_url: str, currency_code: str) -> float:
+async def fetch_upstream_documents(db) -> tuple[UpstreamDocument, UpstreamDocument]:
     """
-    Asynchronously fetches the exchange rate for a given currency
-    from the external API. Returns the rate as a float or raises
-    HTTPException(503) if unavailable.
+    Fetch the country list and the exchange rates concurrently and
+    conditionally, reusing the stored snapshots when they have not changed.
+    The larger, slower countries document is fetched hedged.
     """
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(base_url)
-            response.raise_for_status()
-            data = response.json()
-
-        rates = data.get("rates", {})
-        rate = rates.get(currency_code)
+    countries_validators = await load_validators(db, "countries")
+    rates_validators = await load_validators(db, "rates")
 
-        if rate is None:
-            raise ValueError(f"Exchange rate for {currency_code} not found.")
+    return await asyncio.gather(
+        fetch_document(hedged_get, "countries", COUNTRIES_URL, countries_validators),
+        fetch_document(get_with_retry, "rates", EXCHANGE_URL, rates_validators),
+    )
 
-        return rate
 
-    except httpx.RequestError as e:
-        # Handles network, DNS, or connection issues
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail={
-                "error": "External data source unavailable",
-                "details": f"Could not fetch data from Exchange Rate API: {str(e)}",
-            },
-        )
-    except httpx.HTTPStatusError as e:
-        # Handles non-2xx responses explicitly
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail={
-                "error": "Exchange Rate API returned an invalid response",
-                "details": str(e),
-            },
-        )
-    except Exception as e:
-        # General fallback for unexpected errors
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail={
-                "error": "External data source unavailable",
-                "details": f"Exchange Rate API error: {str(e)}",
-            },
-        )
+async def query_summary(db) -> dict:
+    """
+    Collect the figures shown on the summary image: total countries,
+    top countries by GDP and the last refresh time, from the aggregates.
+    """
+    return summary_from_total(await read_total(db))
 
 
-async def fetch_countries_data(countries_url: str, exchange_base_url: str):
+async def generate_summary_image(db, summary: dict | None = None):
     """
-    Asynchronously fetches country data and exchange rates concurrently,
-    enriches each country with its currency exchange rate and estimated GDP.
-    Raises HTTPException(503) if any external source is unavailable.
+    Generate a visual summary of country statistics, store it in the local
+    content-addressed cache and replicate it in the background.
+    Pass ``summary`` to skip querying the figures again.
     """
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            # Concurrently fetch both resources
-            exchange_task = client.get(exchange_base_url)
-            countries_task = client.get(countries_url)
-
-            exchange_response, country_response = await asyncio.gather(
-                exchange_task, countries_task
-            )
-
-            # Validate HTTP responses
-            exchange_response.raise_for_status()
-            country_response.raise_for_status()
-
-            exchange_data = exchange_response.json()
-            rates = exchange_data.get("rates", {})
-            countries = country_response.json()
-
-        enriched_countries = []
-
-        for c in countries:
-            name = c.get("name")
-            capital = c.get("capital")
-            region = c.get("region")
-            population = c.get("population", 0)
-            flag_url = c.get("flag")
-
-            currencies = c.get("currencies", [])
-            currency_code = None
-            exchange_rate = None
-            estimated_gdp = None
-
-            if currencies and isinstance(currencies, list):
-                currency_code = currencies[0].get("code") if currencies[0] else None
-
-                if currency_code and currency_code in rates:
-                    exchange_rate = rates[currency_code]
-                    # GDP estimation based on population and simulated factor
-                    estimated_gdp = (
-                        population * random.uniform(1000, 2000) / exchange_rate
-                    )
-                else:
-                    estimated_gdp = 0
-
-            enriched_countries.append(
-                {
-                    "name": name,
-                    "capital": capital,
-                    "region": region,
-                    "population": population,
-                    "currency_code": currency_code,
-                    "exchange_rate": exchange_rate,
-                    "estimated_gdp": estimated_gdp,
-                    "flag_url": flag_url,
-                }
-            )
-
-        return enriched_countries
-
-    except httpx.RequestError as e:
-        # Network or connection failure
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail={
-                "error": "External data source unavailable",
-                "details": f"Network request failed: {str(e)}",
-            },
-        )
-
-    except httpx.HTTPStatusError as e:
-        # API returned non-2xx status
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail={
-                "error": "Invalid response from external API",
-                "details": f"Status code: {e.response.status_code}, URL: {e.request.url}",
-            },
-        )
+        image = await render_summary(summary or await query_summary(db))
+        return {"summary_image": image.digest}
 
     except Exception as e:
-        # Catch-all for any unexpected runtime issue
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail={
-                "error": "Data processing error",
+                "error": "Failed to generate summary image",
                 "details": str(e),
             },
         )
 
 
-async def generate_summary_image(db):
-    """
-    Generate a visual summary of country statistics and upload to Dropbox (async-safe).
-    """
-    try:
-        # --- Query Data ---
-        # Total countries
-        total_result = await db.execute(select(func.count(CountryData.country_id)))
-        total_countries = total_result.scalar_one_or_none() or 0
-
-        # Top 5 countries by GDP
-        top_result = await db.execute(
-            select(CountryData.country_name, CountryData.estimated_gdp)
-            .where(CountryData.estimated_gdp.isnot(None))
-            .order_by(CountryData.estimated_gdp.desc())
-            .limit(5)
-        )
-        top_countries = top_result.all()
+async def _mark_refreshed(db):
+    meta = await db.get(SystemMeta, STATUS_KEY)
+    if not meta:
+        db.add(SystemMeta(key=STATUS_KEY, value="active", last_refreshed_at=datetime.utcnow()))
+    else:
+        meta.last_refreshed_at = datetime.utcnow()
+    # The aggregates read it back through the session
+    await db.flush()
 
-        # Last refresh timestamp
-        last_refresh_result = await db.execute(
-            select(func.max(CountryData.last_refreshed_at))
-        )
-        last_refresh = last_refresh_result.scalar_one_or_none() or datetime.utcnow()
-
-        # --- Create the image ---
-        img = Image.new("RGB", (800, 500), color=(240, 240, 240))
-        draw = ImageDraw.Draw(img)
-
-        try:
-            font_title = ImageFont.truetype("arial.ttf", 28)
-            font_text = ImageFont.truetype("arial.ttf", 20)
-        except Exception:
-            font_title = font_text = None  # fallback if Arial is missing
-
-        draw.text((50, 40), "Countries Summary", fill="black", font=font_title)
-        draw.text(
-            (50, 100),
-            f"Total Countries: {total_countries}",
-            fill="black",
-            font=font_text,
-        )
-        draw.text((50, 140), "Top 5 by Estimated GDP:", fill="black", font=font_text)
 
-        y = 180
-        for idx, (name, gdp) in enumerate(top_countries, start=1):
-            draw.text(
-                (70, y), f"{idx}. {name} — {gdp:,.1f}", fill="black", font=font_text
-            )
-            y += 30
+async def _commit_refresh(db, documents: tuple[UpstreamDocument, ...]) -> dict:
+    for document in documents:
+        await save_validators(db, document)
 
-        draw.text(
-            (50, y + 30),
-            f"Last Refreshed: {last_refresh.isoformat()}Z",
-            fill="gray",
-            font=font_text,
-        )
+    generation = await db.run_sync(bump_generation)
+    summary = await query_summary(db)
+    await db.commit()
+    response_cache.observe_generation(generation)
 
-        # --- Convert image to bytes ---
-        image_bytes = io.BytesIO()
-        img.save(image_bytes, format="PNG")
-        image_bytes.seek(0)
-
-        # --- Upload to Dropbox (sync I/O safe in threadpool if needed) ---
-        dbx.files_upload(
-            image_bytes.read(),
-            DROPBOX_PATH,
-            mode=dropbox.files.WriteMode("overwrite"),
-            mute=True,
-        )
+    # Snapshots go last so a failed write is retried with a full fetch
+    for document in documents:
+        await save_snapshot(document)
+    return summary
 
-        # --- Create or retrieve a shareable link ---
-        try:
-            shared_link_metadata = dbx.sharing_create_shared_link_with_settings(
-                DROPBOX_PATH
-            )
-            shared_url = shared_link_metadata.url.replace("?dl=0", "?raw=1")
-        except dropbox.exceptions.ApiError:
-            links = dbx.sharing_list_shared_links(path=DROPBOX_PATH).links
-            if not links:
-                raise
-            shared_url = links[0].url.replace("?dl=0", "?raw=1")
 
-        return {"summary_image_url": shared_url}
+async def write_countries(
+    db,
+    rows: list[dict],
+    documents: tuple[UpstreamDocument, ...] = (),
+    rate_history: list[dict] = (),
+    rewrite_gdp: bool = False,
+) -> tuple[dict, dict]:
+    """
+    Write stage: bulk upsert, aggregates, rate history, metadata, upstream
+    validators, applied digests and generation bump in a single transaction.
+    ``rewrite_gdp`` stores the estimates of every row, not just changed ones.
+    Returns the upsert counts and the summary figures read inside that same
+    transaction.
+    """
+    counts = await db.run_sync(bulk_upsert_countries, rows, rewrite_gdp=rewrite_gdp)
+    if rate_history:
+        await db.run_sync(append_rate_history, list(rate_history))
+    await _mark_refreshed(db)
+    await db.run_sync(rebuild_aggregates)
+    if documents:
+        await save_applied(db, documents)
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={
-                "error": "Failed to generate or upload summary image",
-                "details": str(e),
-            },
-        )
+    return counts, await _commit_refresh(db, documents)
 
 
-async def refresh_countries_data(db):
+async def record_unchanged_refresh(db, documents: tuple[UpstreamDocument, ...]) -> dict:
     """
-    Asynchronously refreshes country data and exchange rates,
-    updates the database, and regenerates summary visualization.
+    Write stage of a refresh whose documents were already applied: only the
+    refresh time and the validators move on. Returns the summary figures.
     """
-    countries_url = "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies"
-    exchange_url = "https://open.er-api.com/v6/latest/USD"
+    await _mark_refreshed(db)
+    await db.run_sync(touch_aggregates)
+    return await _commit_refresh(db, documents)
 
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            # Run both fetches concurrently
-            exchange_task = client.get(exchange_url)
-            countries_task = client.get(countries_url)
-            exchange_response, country_response = await asyncio.gather(
-                exchange_task, countries_task
-            )
 
-            exchange_response.raise_for_status()
-            country_response.raise_for_status()
-
-            exchange_data = exchange_response.json()
-            country_data = country_response.json()
-
-        rates = exchange_data.get("rates", {})
-        cached_count = 0
-
-        for c in country_data:
-            name = c.get("name")
-            capital = c.get("capital")
-            region = c.get("region")
-            population = c.get("population", 0)
-            flag_url = c.get("flag")
-
-            currencies = c.get("currencies", [])
-            currency_code = None
-            exchange_rate = None
-            estimated_gdp = None
-
-            if currencies and isinstance(currencies, list):
-                currency_code = currencies[0].get("code") if currencies[0] else None
-                if currency_code and currency_code in rates:
-                    exchange_rate = rates[currency_code]
-                    estimated_gdp = round(
-                        population * random.uniform(1000, 2000) / exchange_rate, 1
-                    )
-                else:
-                    estimated_gdp = 0
-
-            # --- Database operations (offloaded to threadpool) ---
-            async def upsert_country():
-                existing_country = (
-                    db.query(CountryData)
-                    .filter(func.lower(CountryData.country_name) == func.lower(name))
-                    .first()
-                )
-
-                if existing_country:
-                    existing_country.capital = capital
-                    existing_country.region = region
-                    existing_country.population = population
-                    existing_country.currency_code = currency_code
-                    existing_country.exchange_rate = exchange_rate
-                    existing_country.estimated_gdp = estimated_gdp
-                    existing_country.flag_url = flag_url
-                    existing_country.last_refreshed_at = datetime.utcnow()
-                else:
-                    new_country = CountryData(
-                        country_name=name,
-                        capital=capital,
-                        region=region,
-                        population=population,
-                        currency_code=currency_code,
-                        exchange_rate=exchange_rate,
-                        estimated_gdp=estimated_gdp,
-                        flag_url=flag_url,
-                    )
-                    db.add(new_country)
-
-            await run_in_threadpool(upsert_country)
-            cached_count += 1
-
-        # --- Update global metadata ---
-        async def update_meta():
-            meta = (
-                db.query(SystemMeta).filter(SystemMeta.key == "global_status").first()
-            )
-            if not meta:
-                meta = SystemMeta(
-                    key="global_status",
-                    value="active",
-                    last_refreshed_at=datetime.utcnow(),
-                )
-                db.add(meta)
-            else:
-                meta.last_refreshed_at = datetime.utcnow()
-            db.commit()
+def _elapsed_ms(started: float, stage: str | None = None) -> float:
+    elapsed = time.perf_counter() - started
+    if stage:
+        observe_stage(stage, elapsed)
+    return round(elapsed * 1000, 1)
 
-        await run_in_threadpool(update_meta)
 
-        # --- Generate summary image (can be CPU-bound) ---
-        await run_in_threadpool(generate_summary_image, db)
+async def refresh_countries_data(db, wait_for_image: bool = False, seed: int | None = None):
+    """
+    Refresh country data as a staged pipeline: conditional fetch, pure
+    transform, one batched write transaction, then the summary image
+    render in a process pool and, in the background, the flag cache sync.
+
+    When country_data was last written from these exact documents (their
+    digests are stored with the data), the transform, upsert and flag sync
+    are skipped and only the refresh time moves on. Otherwise every row is
+    diffed by content hash, and rows whose source fields are unchanged are
+    left untouched by the write.
+
+    GDP estimates are drawn from a generator seeded with ``seed`` (a fresh
+    one when omitted), which is returned. Rows left unchanged keep their
+    earlier estimate, except when ``seed`` is given: the refresh then always
+    runs and rewrites every estimate, so passing a returned seed back
+    replays that draw for the whole table.
+
+    The render overlaps with the HTTP response unless ``wait_for_image``
+    is set. Returns the total, the inserted/updated/unchanged counts and
+    per-stage timings in milliseconds.
+    """
+    # Deferred: NumPy is only needed once a refresh runs
+    from api.utils.enrichment import new_seed, transform_countries
 
-        return cached_count
+    timings = {}
+    replay = seed is not None
+    if seed is None:
+        seed = new_seed()
+
+    try:
+        # --- Fetch ---
+        started = time.perf_counter()
+        documents = tuple(await fetch_upstream_documents(db))
+        countries_doc, rates_doc = documents
+        applied = await load_applied(db)
+        timings["fetch_ms"] = _elapsed_ms(started, "fetch")
+
+        if not replay and applied == applied_digests(documents):
+            # country_data already holds exactly these documents
+            rows, seed = None, None
+            started = time.perf_counter()
+            summary = await record_unchanged_refresh(db, documents)
+            counts = {"inserted": 0, "updated": 0, "unchanged": summary["total_countries"]}
+            timings["transform_ms"] = None
+            timings["write_ms"] = _elapsed_ms(started, "write")
+
+        else:
+            # --- Transform ---
+            started = time.perf_counter()
+            rates_payload = rates_doc.json()
+            rows = transform_countries(countries_doc.json(), rates_payload.get("rates", {}), seed)
+            rate_history = []
+            if rates_doc.digest != applied.get(rates_doc.name):
+                rate_history = rate_history_rows(rates_payload)
+            timings["transform_ms"] = _elapsed_ms(started, "transform")
+
+            # --- Write ---
+            started = time.perf_counter()
+            counts, summary = await write_countries(
+                db, rows, documents, rate_history, rewrite_gdp=replay
+            )
+            timings["write_ms"] = _elapsed_ms(started, "write")
 
     except httpx.RequestError as e:
         raise HTTPException(
@@ -379,3 +225,25 @@ async def refresh_countries_data(db):
                 "details": str(e),
             },
         )
+
+    # --- Render ---
+    if wait_for_image:
+        started = time.perf_counter()
+        await generate_summary_image(db, summary)
+        timings["render_ms"] = _elapsed_ms(started)
+    else:
+        schedule_summary_render(summary)
+        timings["render_ms"] = None
+
+    # --- Flags ---
+    if rows is not None:
+        schedule_flag_sync(rows)
+
+    return {
+        "total_cached": summary["total_countries"],
+        **counts,
+        "upstream_changed": any(document.changed for document in documents),
+        "stale_sources": [d.name for d in documents if d.stale],
+        "seed": seed,
+        "timings": timings,
+    }
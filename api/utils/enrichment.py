@@ -0,0 +1,101 @@
+import os, secrets
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv(".env.config")
+
+# Simulated GDP-per-capita factor range
+GDP_MULTIPLIER_LOW = 1000.0
+GDP_MULTIPLIER_HIGH = 2000.0
+
+# Fixed seed for every refresh; unset draws a fresh one each time
+ENRICHMENT_SEED = os.getenv("ENRICHMENT_SEED")
+
+
+def new_seed() -> int:
+    if ENRICHMENT_SEED:
+        return int(ENRICHMENT_SEED)
+    return secrets.randbits(63)
+
+
+def _first_currency(country: dict) -> tuple[bool, str | None]:
+    """
+    Return (has_currencies, code of the first currency).
+    """
+    currencies = country.get("currencies", [])
+    if not currencies or not isinstance(currencies, list):
+        return False, None
+    return True, currencies[0].get("code") if currencies[0] else None
+
+
+def estimate_gdp(
+    populations: np.ndarray, rates: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    population * uniform(1000, 2000) / rate for every row at once, rounded
+    to one decimal. One multiplier is drawn per row, whether or not it has a
+    rate, so a row's value depends only on the seed and its position.
+    Rows without a usable rate come back as NaN.
+    """
+    multipliers = rng.uniform(GDP_MULTIPLIER_LOW, GDP_MULTIPLIER_HIGH, size=len(populations))
+    usable = np.isfinite(rates) & (rates > 0)
+    gdp = np.full(len(populations), np.nan)
+    np.divide(populations * multipliers, rates, out=gdp, where=usable)
+    return np.round(gdp, 1)
+
+
+def transform_countries(
+    countries: list[dict], rates: dict, rng: np.random.Generator | int | None = None
+) -> list[dict]:
+    """
+    Pure transform from the upstream payloads to country rows: picks the
+    first currency, looks up its USD rate and estimates GDP. No I/O.
+
+    Rates are looked up once per distinct currency and GDP is computed in
+    one vectorized pass. Pass a generator or an integer seed as ``rng``
+    to make the estimates reproducible.
+    """
+    rng = np.random.default_rng(rng)
+
+    # --- Columns: first currency per row, rate looked up once per currency ---
+    firsts = [_first_currency(c) for c in countries]
+    codes = [code for _, code in firsts]
+    currency_rates = {code: rates.get(code) if code else None for code in set(codes)}
+
+    populations = np.array(
+        [c.get("population", 0) or 0 for c in countries], dtype=np.float64
+    )
+    row_rates = np.array(
+        [currency_rates[code] for code in codes], dtype=np.float64
+    )  # None becomes NaN
+
+    gdp = estimate_gdp(populations, row_rates, rng)
+
+    # --- Back to row dicts for the write stage ---
+    rows = []
+    for country, (has_currencies, code), rate, value in zip(
+        countries, firsts, row_rates.tolist(), gdp.tolist()
+    ):
+        has_rate = rate == rate  # False for NaN
+        if not has_currencies:
+            estimated_gdp = None
+        elif has_rate and value == value:
+            estimated_gdp = value
+        else:
+            estimated_gdp = 0
+
+        rows.append(
+            {
+                "country_name": country.get("name"),
+                "capital": country.get("capital"),
+                "region": country.get("region"),
+                "population": country.get("population", 0),
+                "currency_code": code,
+                "exchange_rate": rate if has_rate else None,
+                "estimated_gdp": estimated_gdp,
+                "flag_url": country.get("flag"),
+            }
+        )
+
+    return rows
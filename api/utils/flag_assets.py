@@ -0,0 +1,330 @@
+import asyncio, hashlib, io, json, logging, os, re, threading
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+import httpx
+from api.utils.http_client import get_with_retry
+from api.utils.metrics import stage_timer
+from api.utils.storage import local_storage
+from api.utils.summary_image import in_render_pool
+
+
+load_dotenv(".env.config")
+
+logger = logging.getLogger(__name__)
+
+
+FLAGS_PREFIX = "flags"
+# Maps each flag code to its source and digest, and names the current sprite
+FLAG_MANIFEST_KEY = f"{FLAGS_PREFIX}/manifest.json"
+
+FLAG_CACHE_ENABLED = os.getenv("FLAG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FLAG_DOWNLOAD_CONCURRENCY = int(os.getenv("FLAG_DOWNLOAD_CONCURRENCY", "8"))
+FLAG_THUMBNAIL_WIDTH = int(os.getenv("FLAG_THUMBNAIL_WIDTH", "80"))
+FLAG_SPRITE_CELL_WIDTH = int(os.getenv("FLAG_SPRITE_CELL_WIDTH", "40"))
+FLAG_SPRITE_CELL_HEIGHT = int(os.getenv("FLAG_SPRITE_CELL_HEIGHT", "30"))
+FLAG_SPRITE_COLUMNS = int(os.getenv("FLAG_SPRITE_COLUMNS", "16"))
+# Larger flag sets get thumbnails but no sprite sheet
+FLAG_SPRITE_MAX_FLAGS = int(os.getenv("FLAG_SPRITE_MAX_FLAGS", "1024"))
+
+# Pillow cannot read SVG; flagcdn serves PNG renditions at fixed widths
+FLAGCDN_PNG_WIDTH = 320
+# Flags rendered per process pool task
+_RENDER_BATCH = 64
+
+# format -> (Pillow format, media type, encoder options)
+FLAG_FORMATS = {
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "webp": ("WEBP", "image/webp", {"quality": 85, "method": 4}),
+}
+
+_CODE_PATTERN = re.compile(r"[a-z0-9_-]{1,32}")
+
+
+def flag_code(flag_url: str | None) -> str | None:
+    """
+    The code a flag is served under: its file name without extension
+    (``https://flagcdn.com/ng.svg`` -> ``ng``).
+    """
+    if not flag_url:
+        return None
+    name = urlsplit(flag_url).path.rsplit("/", 1)[-1].rsplit(".", 1)[0].lower()
+    return name if _CODE_PATTERN.fullmatch(name) else None
+
+
+def raster_source(flag_url: str) -> str:
+    """
+    A URL Pillow can decode for ``flag_url``: flagcdn SVGs are swapped for
+    flagcdn's PNG rendition, anything else is fetched as is.
+    """
+    parts = urlsplit(flag_url)
+    if parts.hostname and parts.hostname.endswith("flagcdn.com") and parts.path.endswith(".svg"):
+        code = parts.path.rsplit("/", 1)[-1][: -len(".svg")]
+        return f"{parts.scheme}://{parts.netloc}/w{FLAGCDN_PNG_WIDTH}/{code}.png"
+    return flag_url
+
+
+def original_key(digest: str) -> str:
+    return f"{FLAGS_PREFIX}/originals/{digest}"
+
+
+def thumbnail_key(digest: str, image_format: str) -> str:
+    return f"{FLAGS_PREFIX}/thumbs/{digest}-{FLAG_THUMBNAIL_WIDTH}.{image_format}"
+
+
+def sprite_key(sprite_id: str, image_format: str) -> str:
+    return f"{FLAGS_PREFIX}/sprite/{sprite_id}.{image_format}"
+
+
+def sprite_index_key(sprite_id: str) -> str:
+    return f"{FLAGS_PREFIX}/sprite/{sprite_id}.json"
+
+
+# --- Render worker side: everything below runs in the process pool ---
+
+
+def _encode(img, image_format: str) -> bytes:
+    pillow_format, _, options = FLAG_FORMATS[image_format]
+    image_bytes = io.BytesIO()
+    img.save(image_bytes, format=pillow_format, **options)
+    return image_bytes.getvalue()
+
+
+def render_flag_thumbnails(originals: list[bytes], width: int) -> list[dict | None]:
+    """
+    Thumbnails ``width`` pixels wide of each original, as {format: bytes},
+    or None for an original Pillow cannot decode.
+    """
+    from PIL import Image
+
+    results = []
+    for data in originals:
+        try:
+            img = Image.open(io.BytesIO(data))
+            img = img.convert("RGBA")
+        except Exception:
+            results.append(None)
+            continue
+        if img.width != width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        results.append({image_format: _encode(img, image_format) for image_format in FLAG_FORMATS})
+    return results
+
+
+def render_flag_sprite(
+    thumbnails: list[bytes], cell: tuple[int, int], columns: int
+) -> dict[str, bytes]:
+    """
+    One sheet with every thumbnail fitted into a ``cell``-sized slot, row
+    by row, ``columns`` per row, as {format: bytes}.
+    """
+    from PIL import Image, ImageOps
+
+    cell_width, cell_height = cell
+    rows = (len(thumbnails) + columns - 1) // columns
+    sheet = Image.new("RGBA", (cell_width * min(columns, len(thumbnails)), cell_height * rows))
+    for index, data in enumerate(thumbnails):
+        img = ImageOps.contain(Image.open(io.BytesIO(data)).convert("RGBA"), cell, Image.LANCZOS)
+        x = (index % columns) * cell_width + (cell_width - img.width) // 2
+        y = (index // columns) * cell_height + (cell_height - img.height) // 2
+        sheet.paste(img, (x, y))
+    return {image_format: _encode(sheet, image_format) for image_format in FLAG_FORMATS}
+
+
+# --- Event loop side ---
+
+
+_manifest: dict | None = None
+_manifest_mtime: float | None = None
+_manifest_lock = threading.Lock()
+
+
+def current_flag_manifest() -> dict | None:
+    """
+    The latest flag manifest, re-read only when another worker has
+    replaced it since we last looked.
+    """
+    global _manifest, _manifest_mtime
+
+    path = local_storage.path_for(FLAG_MANIFEST_KEY)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    with _manifest_lock:
+        if _manifest is None or mtime != _manifest_mtime:
+            _manifest = json.loads(path.read_bytes())
+            _manifest_mtime = mtime
+        return _manifest
+
+
+async def _download(url: str, slots: asyncio.Semaphore) -> str | None:
+    """
+    Fetch one flag and store it under its content hash; returns the digest,
+    or None when it could not be fetched (retried on the next sync).
+    """
+    try:
+        async with slots:
+            response = await get_with_retry(raster_source(url))
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("Could not download flag %s: %s", url, e)
+        return None
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    key = original_key(digest)
+    if not await local_storage.exists(key):
+        await local_storage.put(key, response.content, response.headers.get("content-type"))
+    return digest
+
+
+async def _render_thumbnails(digests: list[str]) -> set[str]:
+    """
+    Render missing thumbnails in the process pool; returns the digests
+    Pillow could not decode.
+    """
+    missing = [d for d in digests if not await local_storage.exists(thumbnail_key(d, "png"))]
+    batches = [missing[i : i + _RENDER_BATCH] for i in range(0, len(missing), _RENDER_BATCH)]
+
+    async def render(batch: list[str]) -> set[str]:
+        originals = [await local_storage.get(original_key(d)) for d in batch]
+        undecodable = set()
+        results = await in_render_pool(render_flag_thumbnails, originals, FLAG_THUMBNAIL_WIDTH)
+        for digest, thumbnails in zip(batch, results):
+            if thumbnails is None:
+                undecodable.add(digest)
+                continue
+            for image_format, data in thumbnails.items():
+                await local_storage.put(
+                    thumbnail_key(digest, image_format), data, FLAG_FORMATS[image_format][1]
+                )
+        return undecodable
+
+    undecodable = set()
+    for result in await asyncio.gather(*(render(batch) for batch in batches)):
+        undecodable |= result
+    return undecodable
+
+
+async def _build_sprite(flags: dict[str, str]) -> str | None:
+    """
+    Sprite sheet and offset index for ``flags`` (code -> digest), stored
+    under a hash of their contents; returns that id.
+    """
+    if not flags or len(flags) > FLAG_SPRITE_MAX_FLAGS:
+        return None
+
+    codes = sorted(flags)
+    cell = (FLAG_SPRITE_CELL_WIDTH, FLAG_SPRITE_CELL_HEIGHT)
+    layout = json.dumps([[code, flags[code]] for code in codes] + [cell, FLAG_SPRITE_COLUMNS])
+    sprite_id = hashlib.sha256(layout.encode()).hexdigest()[:32]
+    if await local_storage.exists(sprite_index_key(sprite_id)):
+        return sprite_id
+
+    thumbnails = [await local_storage.get(thumbnail_key(flags[code], "png")) for code in codes]
+    sheets = await in_render_pool(render_flag_sprite, thumbnails, cell, FLAG_SPRITE_COLUMNS)
+    for image_format, data in sheets.items():
+        await local_storage.put(sprite_key(sprite_id, image_format), data, FLAG_FORMATS[image_format][1])
+
+    index = {
+        "cell": {"width": cell[0], "height": cell[1]},
+        "columns": FLAG_SPRITE_COLUMNS,
+        "flags": {
+            code: [(i % FLAG_SPRITE_COLUMNS) * cell[0], (i // FLAG_SPRITE_COLUMNS) * cell[1]]
+            for i, code in enumerate(codes)
+        },
+    }
+    # Written last: its presence means the sheets are complete
+    await local_storage.put(
+        sprite_index_key(sprite_id), json.dumps(index).encode(), "application/json"
+    )
+    return sprite_id
+
+
+_sync_lock = asyncio.Lock()
+
+
+async def _sync(flag_urls: dict[str, str]) -> dict:
+    previous = (current_flag_manifest() or {}).get("flags", {})
+    flags, to_fetch = {}, {}
+    for code, url in flag_urls.items():
+        known = previous.get(code)
+        digest = known["digest"] if known else None
+        if known and known["url"] == url and (
+            digest is None or await local_storage.exists(original_key(digest))
+        ):
+            flags[code] = dict(known)
+        else:
+            to_fetch[code] = url
+
+    slots = asyncio.Semaphore(FLAG_DOWNLOAD_CONCURRENCY)
+    digests = await asyncio.gather(*(_download(url, slots) for url in to_fetch.values()))
+    for (code, url), digest in zip(to_fetch.items(), digests):
+        if digest is not None:
+            flags[code] = {"url": url, "digest": digest}
+    downloaded = sum(1 for digest in digests if digest is not None)
+
+    # Flags that are not images keep a null digest so they are not re-fetched
+    undecodable = await _render_thumbnails(
+        sorted({flag["digest"] for flag in flags.values() if flag["digest"] is not None})
+    )
+    for code, flag in flags.items():
+        if flag["digest"] in undecodable:
+            logger.warning("Flag %s (%s) is not an image Pillow can read", code, flag["url"])
+            flag["digest"] = None
+
+    servable = {code: flag["digest"] for code, flag in flags.items() if flag["digest"] is not None}
+    manifest = {"flags": flags, "sprite": await _build_sprite(servable)}
+    await local_storage.put(FLAG_MANIFEST_KEY, json.dumps(manifest).encode(), "application/json")
+
+    return {
+        "flags": len(servable),
+        "downloaded": downloaded,
+        "failed": len(to_fetch) - downloaded,
+        "sprite": manifest["sprite"],
+    }
+
+
+async def sync_flags(flag_urls: dict[str, str]) -> dict:
+    """
+    Bring the local flag cache in line with ``flag_urls`` (code -> URL):
+    download new or changed flags with at most FLAG_DOWNLOAD_CONCURRENCY in
+    flight, render their thumbnails in the process pool, rebuild the
+    sprite sheet if the set changed and publish a new manifest.
+    """
+    async with _sync_lock:
+        with stage_timer("flags"):
+            return await _sync(flag_urls)
+
+
+def flag_urls_from_rows(rows: list[dict]) -> dict[str, str]:
+    urls = {}
+    for row in rows:
+        code = flag_code(row.get("flag_url"))
+        if code:
+            urls[code] = row["flag_url"]
+    return urls
+
+
+# Strong references to scheduled syncs so they are not collected
+_sync_tasks: set[asyncio.Task] = set()
+
+
+async def _sync_logged(flag_urls: dict[str, str]):
+    try:
+        await sync_flags(flag_urls)
+    except Exception:
+        logger.exception("Flag sync failed")
+
+
+def schedule_flag_sync(rows: list[dict]) -> asyncio.Task | None:
+    """
+    Start syncing the flags of ``rows`` in the background; syncs run one
+    at a time, in the order they were scheduled.
+    """
+    if not FLAG_CACHE_ENABLED:
+        return None
+    task = asyncio.create_task(_sync_logged(flag_urls_from_rows(rows)))
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+    return task
@@ -0,0 +1,248 @@
+import asyncio, importlib.util, logging, os, random, time
+import httpx
+from dotenv import load_dotenv
+
+
+load_dotenv(".env.config")
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 needs the optional h2 package
+HTTP2_ENABLED = (
+    os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    and importlib.util.find_spec("h2") is not None
+)
+
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "5"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Send a second copy of a hedged request if the first is this slow
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "1.5"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(httpx.RequestError):
+    """
+    Raised without touching the network while a host's breaker is open.
+    A RequestError, so callers map it to 503 like any connection failure.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker: opens after ``threshold`` consecutive failures, lets
+    a single trial request through after ``reset_seconds`` (half-open) and
+    closes again on its success.
+    """
+
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+            return True
+        # Only the one trial request is allowed while half-open
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class HostStats:
+    __slots__ = ("requests", "retries", "failures", "rejected", "hedges", "hedge_wins", "breaker")
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.breaker = CircuitBreaker()
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected_by_breaker": self.rejected,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+        }
+
+
+_client: httpx.AsyncClient | None = None
+_hosts: dict[str, HostStats] = {}
+
+
+def _host_stats(url) -> HostStats:
+    host = httpx.URL(str(url)).host
+    stats = _hosts.get(host)
+    if stats is None:
+        stats = _hosts[host] = HostStats()
+    return stats
+
+
+def upstream_stats() -> dict:
+    return {
+        "http2": HTTP2_ENABLED,
+        "hosts": {host: stats.to_dict() for host, stats in _hosts.items()},
+    }
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT_SECONDS,
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The application-wide client. Opened by the lifespan; created on first
+    use for scripts that run without it.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _backoff(attempt: int, response: httpx.Response | None = None) -> float:
+    """
+    Full-jitter exponential backoff, honouring a numeric Retry-After.
+    """
+    delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2**attempt))
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, min(HTTP_BACKOFF_MAX, float(retry_after)))
+    return delay
+
+
+async def request_with_retry(
+    method: str, url: str, *, headers: dict | None = None, retries: int = HTTP_RETRIES
+) -> httpx.Response:
+    """
+    Send a request on the shared client, retrying connection errors and
+    429/5xx responses with jittered backoff, behind the host's breaker.
+
+    Returns the last response once retries run out, so the caller's
+    raise_for_status() still reports it; re-raises the last transport error.
+    """
+    stats = _host_stats(url)
+    client = get_http_client()
+    delay = 0.0
+
+    for attempt in range(retries + 1):
+        if attempt:
+            stats.retries += 1
+            await asyncio.sleep(delay)
+
+        if not stats.breaker.allow():
+            stats.rejected += 1
+            raise CircuitOpenError(f"Circuit open for {httpx.URL(url).host}")
+
+        stats.requests += 1
+        response = None
+        succeeded = False
+        try:
+            response = await client.request(method, url, headers=headers)
+            succeeded = response.status_code not in RETRYABLE_STATUS_CODES
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        finally:
+            # Every attempt records an outcome, even when it is cancelled (a
+            # hedge loser) or fails unexpectedly; a half-open breaker would
+            # otherwise wait for its trial forever. Those count as failures.
+            if succeeded:
+                stats.breaker.record_success()
+            else:
+                stats.failures += 1
+                stats.breaker.record_failure()
+
+        if succeeded or attempt == retries:
+            return response
+        delay = _backoff(attempt, response)
+
+    return response
+
+
+async def get_with_retry(url: str, headers: dict | None = None) -> httpx.Response:
+    return await request_with_retry("GET", url, headers=headers)
+
+
+async def hedged_get(
+    url: str, headers: dict | None = None, delay: float = HEDGE_DELAY_SECONDS
+) -> httpx.Response:
+    """
+    GET ``url``, and if no answer has arrived after ``delay`` seconds send
+    a second identical request; whichever completes first wins and the
+    other is cancelled. Cuts the tail latency of a slow upstream.
+    """
+    stats = _host_stats(url)
+    primary = asyncio.ensure_future(get_with_retry(url, headers))
+
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    stats.hedges += 1
+    hedge = asyncio.ensure_future(get_with_retry(url, headers))
+    pending = {primary, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
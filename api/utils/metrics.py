@@ -0,0 +1,252 @@
+import os, time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+
+load_dotenv(".env.config")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template.",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being served.", ["method"]
+)
+
+# --- Database ---
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Statement execution time; the _count series is the query count.",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Statements that raised.", ["engine"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection (or connecting, without a pool).",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+# --- Refresh pipeline ---
+REFRESH_STAGE_SECONDS = Histogram(
+    "refresh_stage_duration_seconds",
+    "Duration of each refresh stage: fetch, transform, write, render, upload, flags.",
+    ["stage"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REFRESH_JOBS = Counter(
+    "refresh_jobs_total", "Finished refresh jobs by outcome.", ["trigger", "status"]
+)
+REQUEST_COALESCING = Counter(
+    "request_coalescing_total",
+    "Cache misses by role: leaders built a response, followers waited for one.",
+    ["route", "role"],
+)
+COMPRESSIONS = Counter(
+    "response_compressions_total",
+    "Bodies compressed, by encoding; precompressed ones are kept and reused.",
+    ["encoding", "kind"],
+)
+UPLOADS = Counter(
+    "replica_uploads_total", "Artifact replication by outcome: uploaded, skipped, dropped, failed.", ["outcome"]
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Record how long the enclosed block took under ``stage``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REFRESH_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_stage(stage: str, seconds: float):
+    REFRESH_STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Latency is labelled
+    with the matched route template (``/countries/{name}``), never the raw
+    path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            # The router leaves the matched route in the (shared) scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method, getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+def timed_pool(pool_class, engine_name: str):
+    """
+    Subclass ``pool_class`` so checkouts record how long they waited.
+    A subclass (rather than patching the instance) survives
+    ``engine.dispose()``, which rebuilds the pool from its class.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(engine_name).observe(time.perf_counter() - started)
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
+
+
+_engines = {}
+
+
+def instrument_engine(engine, engine_name: str):
+    """
+    Count and time every statement on a (sync) engine. For an async
+    engine pass ``async_engine.sync_engine``.
+    """
+    query_seconds = DB_QUERY_SECONDS.labels(engine_name)
+    query_errors = DB_QUERY_ERRORS.labels(engine_name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        query_seconds.observe(time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        query_errors.inc()
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+
+    _engines[engine_name] = engine
+
+
+class AppCollector:
+    """
+    Exposes counters the application already keeps (upstream client,
+    response cache, connection pools) at scrape time, so the hot paths
+    pay nothing extra for them.
+    """
+
+    def describe(self):
+        # Skips the registry's trial collect(), which would import too early
+        return []
+
+    def collect(self):
+        # Imported here: these modules import the database, which imports us
+        from api.db.database import get_replicas, known_generation
+        from api.utils.http_client import upstream_stats
+        from api.utils.response_cache import response_cache
+
+        # --- Connection pools ---
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out", "Connections currently checked out.", labels=["engine"]
+        )
+        for name, engine in _engines.items():
+            if hasattr(engine.pool, "checkedout"):
+                checked_out.add_metric([name], engine.pool.checkedout())
+        yield checked_out
+
+        replica_lag = GaugeMetricFamily(
+            "db_replica_lag_generations",
+            "Data generations a replica is behind the primary (absent while unreachable).",
+            labels=["replica"],
+        )
+        known = known_generation()
+        for replica in get_replicas():
+            if replica.generation is not None and known is not None:
+                replica_lag.add_metric([replica.name], max(0, known - replica.generation))
+        yield replica_lag
+
+        # --- Response cache ---
+        yield GaugeMetricFamily(
+            "response_cache_entries", "Bodies held in the response cache.",
+            value=len(response_cache),
+        )
+        yield CounterMetricFamily(
+            "response_cache_hits", "Response cache hits.", value=response_cache.hits
+        )
+        yield CounterMetricFamily(
+            "response_cache_misses", "Response cache misses.", value=response_cache.misses
+        )
+        if response_cache.generation is not None:
+            yield GaugeMetricFamily(
+                "data_generation", "Last data generation this worker has seen.",
+                value=response_cache.generation,
+            )
+
+        # --- Upstream client ---
+        hosts = upstream_stats()["hosts"]
+        counters = {
+            "requests": "Upstream requests sent, including retries and hedges.",
+            "retries": "Upstream retries.",
+            "failures": "Upstream requests that failed after retries.",
+            "rejected_by_breaker": "Upstream requests refused by an open circuit breaker.",
+            "hedges": "Hedged upstream requests sent.",
+            "hedge_wins": "Hedged upstream requests that answered first.",
+            "breaker_opened": "Times the circuit breaker opened.",
+        }
+        for field, documentation in counters.items():
+            family = CounterMetricFamily(f"upstream_{field}", documentation, labels=["host"])
+            for host, stats in hosts.items():
+                family.add_metric([host], stats[field])
+            yield family
+
+        breaker_open = GaugeMetricFamily(
+            "upstream_breaker_open", "1 while the host's circuit breaker is open.", labels=["host"]
+        )
+        for host, stats in hosts.items():
+            breaker_open.add_metric([host], 1 if stats["breaker_state"] == "open" else 0)
+        yield breaker_open
+
+
+REGISTRY.register(AppCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    The registry in Prometheus text format, with its content type.
+    Counters are per process; scrape each worker or run a single one.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
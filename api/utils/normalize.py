@@ -0,0 +1,15 @@
+import unicodedata
+
+
+def normalize_name(name: str | None) -> str:
+    """
+    Build the normalized lookup key for a country name.
+    Case-folds, strips accents and collapses whitespace so that
+    "Åland  Islands" and "aland islands" map to the same key.
+    """
+    if not name:
+        return ""
+
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
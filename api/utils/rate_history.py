@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from api.v1.models.exchange_rate_history import ExchangeRateHistory
+
+
+# Rows per INSERT statement
+DEFAULT_CHUNK_SIZE = 500
+
+# Bucket widths accepted by /rates/{code}/history
+HISTORY_INTERVALS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+class RateMatrix:
+    """
+    Latest USD-based rate of every currency. Cross rates between any two
+    currencies are derived from the vector, so converting costs a lookup
+    and a multiplication, never an upstream call.
+    """
+
+    __slots__ = ("usd_rates", "as_of")
+
+    def __init__(self, usd_rates: dict[str, float], as_of: datetime | None = None):
+        self.usd_rates = {"USD": 1.0, **usd_rates}
+        self.as_of = as_of
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.usd_rates
+
+    def rate(self, code: str) -> float | None:
+        """
+        Units of ``code`` per US dollar.
+        """
+        return self.usd_rates.get(code)
+
+    def cross(self, source: str, target: str) -> float | None:
+        """
+        Units of ``target`` per unit of ``source``.
+        """
+        source_rate, target_rate = self.usd_rates.get(source), self.usd_rates.get(target)
+        if not source_rate or target_rate is None:
+            return None
+        return target_rate / source_rate
+
+
+def rate_history_rows(rates_payload: dict) -> list[dict]:
+    """
+    History rows for one open.er-api style document, stamped with its
+    ``time_last_update_unix`` (or now, if the upstream does not say).
+    """
+    updated = rates_payload.get("time_last_update_unix")
+    recorded_at = (
+        datetime.utcfromtimestamp(updated) if updated else datetime.utcnow()
+    ).replace(microsecond=0)
+    return [
+        {"currency_code": code, "recorded_at": recorded_at, "rate": float(rate)}
+        for code, rate in rates_payload.get("rates", {}).items()
+        if rate is not None and len(code) <= 10
+    ]
+
+
+def _insert_ignore(dialect_name: str, table, rows: list[dict]):
+    if dialect_name == "mysql":
+        return mysql_insert(table).values(rows).prefix_with("IGNORE")
+    if dialect_name in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+        return insert(table).values(rows).on_conflict_do_nothing()
+    raise ValueError(f"Rate history is not supported for dialect '{dialect_name}'.")
+
+
+def append_rate_history(
+    session: Session, rows: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Append rate rows in multi-row INSERTs, skipping (currency, time) pairs
+    already stored. The caller owns the transaction. From async code use
+    ``await async_session.run_sync(append_rate_history, rows)``.
+    """
+    table = ExchangeRateHistory.__table__
+    dialect_name = session.get_bind().dialect.name
+    for start in range(0, len(rows), chunk_size):
+        session.execute(_insert_ignore(dialect_name, table, rows[start : start + chunk_size]))
+    return len(rows)
+
+
+async def load_rate_matrix(db: AsyncSession) -> RateMatrix:
+    """
+    Build the matrix from the most recent history row of each currency.
+    """
+    latest = (
+        select(
+            ExchangeRateHistory.currency_code,
+            func.max(ExchangeRateHistory.recorded_at).label("recorded_at"),
+        )
+        .group_by(ExchangeRateHistory.currency_code)
+        .subquery()
+    )
+    result = await db.execute(
+        select(ExchangeRateHistory.currency_code, ExchangeRateHistory.rate, latest.c.recorded_at).join(
+            latest,
+            (ExchangeRateHistory.currency_code == latest.c.currency_code)
+            & (ExchangeRateHistory.recorded_at == latest.c.recorded_at),
+        )
+    )
+    rows = result.all()
+    as_of = max((row.recorded_at for row in rows), default=None)
+    return RateMatrix({row.currency_code: row.rate for row in rows}, as_of)
+
+
+async def read_rate_history(
+    db: AsyncSession, code: str, start: datetime | None = None, end: datetime | None = None
+) -> list[tuple[datetime, float]]:
+    stmt = select(ExchangeRateHistory.recorded_at, ExchangeRateHistory.rate).where(
+        ExchangeRateHistory.currency_code == code
+    )
+    if start:
+        stmt = stmt.where(ExchangeRateHistory.recorded_at >= start)
+    if end:
+        stmt = stmt.where(ExchangeRateHistory.recorded_at <= end)
+    result = await db.execute(stmt.order_by(ExchangeRateHistory.recorded_at))
+    return [tuple(row) for row in result.all()]
+
+
+def downsample(points: list[tuple[datetime, float]], interval: str, max_points: int) -> list[dict]:
+    """
+    Aggregate points into ``interval`` buckets (mean, min, max, last and
+    count per bucket), or keep them raw, then thin the series to at most
+    ``max_points`` by an even stride that always keeps the latest point.
+    """
+    if interval == "raw":
+        series = [{"t": t, "rate": rate} for t, rate in points]
+    else:
+        width = HISTORY_INTERVALS[interval].total_seconds()
+        buckets = {}
+        for t, rate in points:
+            start = datetime.utcfromtimestamp(
+                (t - datetime(1970, 1, 1)).total_seconds() // width * width
+            )
+            buckets.setdefault(start, []).append(rate)
+        series = [
+            {
+                "t": start,
+                "rate": sum(rates) / len(rates),
+                "min": min(rates),
+                "max": max(rates),
+                "last": rates[-1],
+                "count": len(rates),
+            }
+            for start, rates in buckets.items()
+        ]
+
+    if len(series) > max_points:
+        stride = -(-len(series) // max_points)
+        thinned = series[::stride]
+        if thinned[-1] is not series[-1]:
+            thinned = thinned[: max_points - 1] + [series[-1]]
+        series = thinned
+    return series
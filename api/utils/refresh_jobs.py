@@ -0,0 +1,293 @@
+import asyncio, json, logging, os, random, socket, uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from api.db.database import PrimarySessionLocal
+from api.v1.models.system_meta import SystemMeta
+from api.utils.country_tools import refresh_countries_data
+from api.utils.metrics import REFRESH_JOBS
+
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the scheduler; refreshes then only run on POST /countries/refresh
+REFRESH_INTERVAL_SECONDS = float(os.getenv("REFRESH_INTERVAL_SECONDS", "0"))
+REFRESH_JITTER_SECONDS = float(os.getenv("REFRESH_JITTER_SECONDS", "30"))
+# A crashed worker's lease expires after this long
+REFRESH_LEASE_SECONDS = float(os.getenv("REFRESH_LEASE_SECONDS", "300"))
+REFRESH_JOB_RETENTION_HOURS = float(os.getenv("REFRESH_JOB_RETENTION_HOURS", "24"))
+
+# SystemMeta rows: the lease stores the holder's job id in ``value`` and its
+# expiry in ``last_refreshed_at``; each job stores a compact JSON status.
+LEASE_KEY = "refresh_lease"
+JOB_KEY_PREFIX = "refresh_job:"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Jobs this worker started, most recent last
+MAX_TRACKED_JOBS = 50
+
+
+class RefreshJob:
+    def __init__(self, trigger: str, seed: int | None = None):
+        self.job_id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.seed = seed
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.task: asyncio.Task | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "skipped")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "worker": WORKER_ID,
+            "created_at": self.created_at.isoformat() + "Z",
+            "finished_at": self.finished_at.isoformat() + "Z" if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def to_meta_value(self) -> str:
+        """
+        Compact status for the SystemMeta row (value is limited to 255 chars).
+        """
+        summary = {"status": self.status, "trigger": self.trigger}
+        if self.result:
+            summary.update(
+                {k: self.result.get(k) for k in ("total_cached", "inserted", "updated", "unchanged", "seed")}
+            )
+        if self.error:
+            summary["error"] = str(self.error)
+
+        value = json.dumps(summary, separators=(",", ":"))
+        # Measure the serialized value: escaping turns one character into up to six
+        while len(value) > 255:
+            summary["error"] = summary["error"][: -max(1, (len(value) - 255) // 6)]
+            value = json.dumps(summary, separators=(",", ":"))
+        return value
+
+
+_jobs: OrderedDict[str, RefreshJob] = OrderedDict()
+_current: RefreshJob | None = None
+_start_lock = asyncio.Lock()
+
+
+def _track(job: RefreshJob):
+    _jobs[job.job_id] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+
+
+async def _save_job(job: RefreshJob):
+    async with PrimarySessionLocal() as db:
+        await db.merge(
+            SystemMeta(
+                key=JOB_KEY_PREFIX + job.job_id,
+                value=job.to_meta_value(),
+                last_refreshed_at=job.finished_at or job.created_at,
+            )
+        )
+        await db.commit()
+
+
+async def lease_holder(db) -> str | None:
+    """
+    Return the job id holding an unexpired refresh lease, if any.
+    """
+    lease = await db.get(SystemMeta, LEASE_KEY, populate_existing=True)
+    if lease and lease.value and lease.last_refreshed_at > datetime.utcnow():
+        return lease.value
+    return None
+
+
+async def acquire_lease(job_id: str) -> bool:
+    """
+    Take the cross-worker refresh lease with a conditional UPDATE, so only
+    one worker wins even when several try at the same moment.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=REFRESH_LEASE_SECONDS)
+
+    async with PrimarySessionLocal() as db:
+        result = await db.execute(
+            update(SystemMeta)
+            .where(
+                SystemMeta.key == LEASE_KEY,
+                or_(SystemMeta.value == "", SystemMeta.last_refreshed_at < now),
+            )
+            .values(value=job_id, last_refreshed_at=expires_at)
+        )
+        if result.rowcount == 1:
+            await db.commit()
+            return True
+
+        if await db.get(SystemMeta, LEASE_KEY) is not None:
+            await db.rollback()
+            return False
+
+        db.add(SystemMeta(key=LEASE_KEY, value=job_id, last_refreshed_at=expires_at))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+
+async def release_lease(job_id: str):
+    async with PrimarySessionLocal() as db:
+        await db.execute(
+            update(SystemMeta)
+            .where(SystemMeta.key == LEASE_KEY, SystemMeta.value == job_id)
+            .values(value="")
+        )
+        await db.commit()
+
+
+async def renew_lease(job_id: str) -> bool:
+    """
+    Push the lease expiry out again; False when ``job_id`` no longer holds it.
+    """
+    expires_at = datetime.utcnow() + timedelta(seconds=REFRESH_LEASE_SECONDS)
+    async with PrimarySessionLocal() as db:
+        result = await db.execute(
+            update(SystemMeta)
+            .where(SystemMeta.key == LEASE_KEY, SystemMeta.value == job_id)
+            .values(last_refreshed_at=expires_at)
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+async def _keep_lease(job_id: str):
+    """
+    Renew the lease a few times per lease period while the job runs, so a
+    refresh that outlasts REFRESH_LEASE_SECONDS is not joined by another.
+    """
+    while True:
+        await asyncio.sleep(REFRESH_LEASE_SECONDS / 3)
+        try:
+            if not await renew_lease(job_id):
+                logger.warning("Refresh job %s lost its lease", job_id)
+                return
+        except Exception:
+            logger.exception("Could not renew the lease of refresh job %s", job_id)
+
+
+async def _prune_jobs():
+    cutoff = datetime.utcnow() - timedelta(hours=REFRESH_JOB_RETENTION_HOURS)
+    async with PrimarySessionLocal() as db:
+        await db.execute(
+            delete(SystemMeta).where(
+                SystemMeta.key.like(JOB_KEY_PREFIX + "%"),
+                SystemMeta.last_refreshed_at < cutoff,
+            )
+        )
+        await db.commit()
+
+
+async def _run_job(job: RefreshJob):
+    try:
+        if not await acquire_lease(job.job_id):
+            job.status = "skipped"
+            job.error = "Another worker is already refreshing."
+            return
+
+        keeper = asyncio.create_task(_keep_lease(job.job_id))
+        try:
+            job.status = "running"
+            await _save_job(job)
+            async with PrimarySessionLocal() as db:
+                job.result = await refresh_countries_data(db, wait_for_image=True, seed=job.seed)
+            job.status = "succeeded"
+        finally:
+            keeper.cancel()
+            await release_lease(job.job_id)
+
+    except HTTPException as e:
+        job.status = "failed"
+        job.error = e.detail
+    except Exception as e:
+        logger.exception("Refresh job %s failed", job.job_id)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        REFRESH_JOBS.labels(job.trigger, job.status).inc()
+        try:
+            await _save_job(job)
+            await _prune_jobs()
+        except Exception:
+            logger.exception("Could not record refresh job %s", job.job_id)
+
+
+async def start_refresh(trigger: str = "api", seed: int | None = None) -> tuple[dict, bool]:
+    """
+    Start a refresh unless one is already running in this worker or, per
+    the lease, in another one. ``seed`` redraws every GDP estimate
+    from that seed. Returns (job status, started).
+    """
+    global _current
+
+    async with _start_lock:
+        if _current is not None and not _current.done:
+            return _current.to_dict(), False
+
+        async with PrimarySessionLocal() as db:
+            holder = await lease_holder(db)
+        if holder is not None:
+            existing = await get_job(holder)
+            return existing or {"job_id": holder, "status": "running"}, False
+
+        job = RefreshJob(trigger, seed)
+        _track(job)
+        _current = job
+        await _save_job(job)
+        job.task = asyncio.create_task(_run_job(job))
+        return job.to_dict(), True
+
+
+async def get_job(job_id: str) -> dict | None:
+    """
+    Look up a job started by this worker, or any worker via SystemMeta.
+    """
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+
+    async with PrimarySessionLocal() as db:
+        row = await db.get(SystemMeta, JOB_KEY_PREFIX + job_id)
+    if row is None:
+        return None
+
+    return {"job_id": job_id, **json.loads(row.value), "updated_at": row.last_refreshed_at.isoformat() + "Z"}
+
+
+async def run_scheduler():
+    """
+    Periodically start a refresh, with random jitter so workers spread out.
+    Runs until cancelled.
+    """
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS + random.uniform(0, REFRESH_JITTER_SECONDS))
+        try:
+            await start_refresh("scheduler")
+        except Exception:
+            logger.exception("Scheduled refresh could not be started")
+
+
+def start_scheduler() -> asyncio.Task | None:
+    if REFRESH_INTERVAL_SECONDS <= 0:
+        return None
+    return asyncio.create_task(run_scheduler())
@@ -0,0 +1,280 @@
+import asyncio, hashlib, os, threading, time
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.db.database import AsyncSessionLocal, note_generation
+from api.utils.compression import compress, is_compressible, negotiate, variant_etag
+from api.utils.metrics import REQUEST_COALESCING
+from api.v1.models.system_meta import SystemMeta
+
+
+# SystemMeta row holding the data generation shared by every worker
+GENERATION_KEY = "cache_generation"
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+# Bodies larger than this are served but never cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(
+    os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024))
+)
+# How long a worker trusts its last view of the generation before re-reading it
+GENERATION_POLL_SECONDS = float(os.getenv("CACHE_GENERATION_POLL_SECONDS", "2"))
+
+
+class CachedResponse:
+    __slots__ = (
+        "body",
+        "media_type",
+        "etag",
+        "generation",
+        "expires_at",
+        "headers",
+        "variants",
+        "cached",
+    )
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str,
+        generation: int,
+        expires_at: float,
+        headers: dict | None = None,
+        cached: bool = True,
+    ):
+        self.body = body
+        self.media_type = media_type
+        self.generation = generation
+        self.expires_at = expires_at
+        self.headers = headers
+        # False for bodies served once without being stored in the cache
+        self.cached = cached
+        # encoding -> task compressing the body, made on first request
+        self.variants: dict[str, asyncio.Task] = {}
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of serialized response bodies.
+
+    Every entry is stamped with the data generation it was built from; once
+    the generation moves on (refresh or delete) older entries are dropped.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, poll_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.generation = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation_is_fresh(self) -> bool:
+        return (
+            self.generation is not None
+            and time.monotonic() - self._checked_at < self.poll_seconds
+        )
+
+    def observe_generation(self, generation: int) -> None:
+        """
+        Record the latest known generation, clearing entries if it changed.
+        """
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.generation = generation
+            self._checked_at = time.monotonic()
+        note_generation(generation)
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.generation != self.generation or entry.expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(
+        self, key: str, body: bytes, media_type: str, generation: int, headers: dict | None = None
+    ) -> CachedResponse | None:
+        if len(body) > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            return None
+
+        entry = CachedResponse(
+            body, media_type, generation, time.monotonic() + self.ttl_seconds, headers
+        )
+        with self._lock:
+            # A refresh landed while this body was being built
+            if generation != self.generation:
+                entry.cached = False
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, GENERATION_POLL_SECONDS
+)
+
+
+def make_cache_key(path: str, **params) -> str:
+    """
+    Build a cache key from the route and its normalized query parameters.
+    Parameters left as None are omitted so defaults share one entry.
+    """
+    parts = [f"{name}={value}" for name, value in sorted(params.items()) if value is not None]
+    return path + "?" + "&".join(parts)
+
+
+async def read_generation(db: AsyncSession) -> int:
+    # Always from the primary: replicas are judged against this value
+    value = await db.scalar(
+        select(SystemMeta.value).where(SystemMeta.key == GENERATION_KEY),
+        bind_arguments={"use_primary": True},
+    )
+    return int(value) if value else 0
+
+
+async def current_generation(db: AsyncSession) -> int:
+    """
+    Return the data generation, re-reading SystemMeta at most once per
+    poll interval so cache hits normally cost no query at all.
+    """
+    if response_cache.generation_is_fresh():
+        return response_cache.generation
+
+    generation = await read_generation(db)
+    response_cache.observe_generation(generation)
+    return generation
+
+
+def bump_generation(db: Session) -> int:
+    """
+    Increment the shared generation inside the caller's transaction.
+    Call ``response_cache.observe_generation`` with the result once the
+    transaction has committed. From async code use ``run_sync``.
+    """
+    meta = db.execute(
+        select(SystemMeta).where(SystemMeta.key == GENERATION_KEY).with_for_update()
+    ).scalar_one_or_none()
+
+    if meta is None:
+        generation = 1
+        db.add(
+            SystemMeta(
+                key=GENERATION_KEY,
+                value=str(generation),
+                last_refreshed_at=datetime.utcnow(),
+            )
+        )
+    else:
+        generation = int(meta.value or 0) + 1
+        meta.value = str(generation)
+        meta.last_refreshed_at = datetime.utcnow()
+
+    return generation
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def encoded_body(entry: CachedResponse, encoding: str) -> bytes:
+    """
+    The entry's body compressed with ``encoding``. Compressed once per
+    entry, so once per generation, however many requests ask for it.
+    Entries that are not cached are only shared by coalesced requests, so
+    they get the cheaper dynamic levels.
+    """
+    task = entry.variants.get(encoding)
+    if task is None:
+        task = asyncio.ensure_future(
+            run_in_threadpool(compress, entry.body, encoding, entry.cached)
+        )
+        entry.variants[encoding] = task
+    return await asyncio.shield(task)
+
+
+async def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """
+    Serve a cache entry, answering 304 when the client already has it.
+    Compressible bodies are sent as the precompressed variant the client
+    prefers.
+    """
+    encoding = None
+    if is_compressible(entry.media_type, len(entry.body)):
+        encoding = negotiate(request.headers.get("accept-encoding"))
+
+    etag = variant_etag(entry.etag, encoding) if encoding else entry.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(entry.headers or {})}
+    if is_compressible(entry.media_type):
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(
+        content=await encoded_body(entry, encoding), media_type=entry.media_type, headers=headers
+    )
+
+
+# Responses being built, so identical concurrent requests share one
+_in_flight: dict[tuple[str, int], asyncio.Task] = {}
+
+
+async def _build_entry(key: str, generation: int, build) -> CachedResponse:
+    # Own session: the build outlives the leader if its client goes away
+    async with AsyncSessionLocal() as db:
+        body, media_type, headers = await build(db)
+    entry = response_cache.set(key, body, media_type, generation, headers)
+    # Too large to cache, but still shared with the requests waiting on it
+    return entry or CachedResponse(body, media_type, generation, 0.0, headers, cached=False)
+
+
+async def coalesced(key: str, generation: int, build) -> CachedResponse:
+    """
+    Build the response for a cache miss once, however many identical
+    requests arrive while it is being built. ``build(db)`` returns
+    ``(body, media_type, headers)``; exceptions reach every waiter.
+    """
+    route = key.split("?", 1)[0]
+    flight = (key, generation)
+    task = _in_flight.get(flight)
+    if task is None:
+        REQUEST_COALESCING.labels(route, "leader").inc()
+        task = asyncio.create_task(_build_entry(key, generation, build))
+        _in_flight[flight] = task
+        task.add_done_callback(lambda _: _in_flight.pop(flight, None))
+    else:
+        REQUEST_COALESCING.labels(route, "follower").inc()
+    return await asyncio.shield(task)
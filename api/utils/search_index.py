@@ -0,0 +1,94 @@
+import asyncio, bisect
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.utils.country_snapshot import get_snapshot
+from api.utils.normalize import normalize_name
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class CountrySearchIndex:
+    """
+    Immutable in-memory index over normalized country names.
+
+    Prefix queries binary-search a sorted key list; substring queries
+    intersect trigram posting lists and verify the survivors, falling
+    back to a scan for queries shorter than three characters.
+    """
+
+    def __init__(self, keys: list[str], generation: int | None = None):
+        self.keys = sorted(set(keys))
+        self.generation = generation
+        self.postings: dict[str, list[int]] = {}
+        for position, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, []).append(position)
+
+    def prefix(self, query: str, limit: int) -> list[str]:
+        start = bisect.bisect_left(self.keys, query)
+        matches = []
+        for key in self.keys[start:]:
+            if not key.startswith(query) or len(matches) >= limit:
+                break
+            matches.append(key)
+        return matches
+
+    def substring(self, query: str, limit: int) -> list[str]:
+        if len(query) < 3:
+            candidates = range(len(self.keys))
+        else:
+            lists = [self.postings.get(gram) for gram in trigrams(query)]
+            if not all(lists):
+                return []
+            lists.sort(key=len)
+            positions = set(lists[0]).intersection(*lists[1:])
+            candidates = sorted(positions)
+
+        matches = []
+        for position in candidates:
+            key = self.keys[position]
+            if query in key:
+                matches.append(key)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def search(self, query: str, mode: str = "substring", limit: int = 20) -> list[str]:
+        """
+        Return matching name keys. Substring mode lists prefix matches first.
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        matches = self.prefix(query, limit)
+        if mode == "substring" and len(matches) < limit:
+            seen = set(matches)
+            for key in self.substring(query, limit + len(seen)):
+                if key not in seen:
+                    matches.append(key)
+                    if len(matches) >= limit:
+                        break
+        return matches
+
+
+_index = CountrySearchIndex([])
+_lock = asyncio.Lock()
+
+
+async def get_search_index(db: AsyncSession, generation: int) -> CountrySearchIndex:
+    """
+    Return the index for ``generation``, rebuilding it from the country
+    snapshot when a refresh or delete has moved the generation on.
+    """
+    global _index
+
+    if _index.generation == generation:
+        return _index
+
+    async with _lock:
+        if _index.generation != generation:
+            snapshot = await get_snapshot(db, generation)
+            _index = CountrySearchIndex(list(snapshot.by_name_key), generation)
+        return _index
@@ -0,0 +1,328 @@
+import asyncio, hashlib, importlib.util, io, logging, os, random, uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from api.core.base.storage import Storage
+from api.utils.metrics import UPLOADS, stage_timer
+
+
+load_dotenv(".env.config")
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Background replication: parallel uploads, attempts per upload, backoff base
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+UPLOAD_BACKOFF_SECONDS = float(os.getenv("UPLOAD_BACKOFF_SECONDS", "0.5"))
+# Uploads queued or running before new ones are dropped
+UPLOAD_QUEUE_MAX = int(os.getenv("UPLOAD_QUEUE_MAX", "256"))
+# Keys whose last replicated digest is remembered, least recently used first out
+REPLICATED_KEYS_MAX = int(os.getenv("REPLICATED_KEYS_MAX", "4096"))
+
+# Bodies above this go to S3 as multipart uploads, in parts of this size
+S3_MULTIPART_BYTES = int(os.getenv("S3_MULTIPART_BYTES", str(8 * 1024 * 1024)))
+
+
+class LocalStorage(Storage):
+    """
+    Stores artifacts as files under a root directory. Writes go to a
+    temporary file first and are renamed into place, so readers never
+    see a partially written object.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"Storage key '{key}' escapes the storage root.")
+        return path
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None):
+        await run_in_threadpool(self._write, self.path_for(key), data)
+
+    async def get(self, key: str) -> bytes | None:
+        path = self.path_for(key)
+        try:
+            return await run_in_threadpool(path.read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def exists(self, key: str) -> bool:
+        return self.path_for(key).is_file()
+
+
+class DropboxStorage(Storage):
+    """
+    Stores artifacts in Dropbox under ``root``. The SDK is synchronous,
+    so every call runs in the threadpool.
+    """
+
+    def __init__(self, access_token: str, root: str = "/cache"):
+        self.access_token = access_token
+        self.root = root.rstrip("/")
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import dropbox
+
+            self._client = dropbox.Dropbox(self.access_token)
+        return self._client
+
+    def _path(self, key: str) -> str:
+        return f"{self.root}/{key.lstrip('/')}"
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None):
+        import dropbox.files
+
+        await run_in_threadpool(
+            self._get_client().files_upload,
+            data,
+            self._path(key),
+            mode=dropbox.files.WriteMode("overwrite"),
+            mute=True,
+        )
+
+    async def get(self, key: str) -> bytes | None:
+        import dropbox.exceptions
+
+        try:
+            _, response = await run_in_threadpool(
+                self._get_client().files_download, self._path(key)
+            )
+        except dropbox.exceptions.ApiError:
+            return None
+        return response.content
+
+    async def exists(self, key: str) -> bool:
+        import dropbox.exceptions
+
+        try:
+            await run_in_threadpool(
+                self._get_client().files_get_metadata, self._path(key)
+            )
+        except dropbox.exceptions.ApiError:
+            return False
+        return True
+
+
+class S3Storage(Storage):
+    """
+    Stores artifacts in an S3-compatible bucket under ``prefix``.
+    Credentials come from the standard AWS chain (environment, shared
+    config or instance role). boto3 is synchronous, so every call runs in
+    the threadpool; large bodies are sent as managed multipart uploads.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "cache",
+        endpoint_url: str | None = None,
+        region: str | None = None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._client = None
+        self._transfer_config = None
+
+    def _get_client(self):
+        if self._client is None:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                config=Config(max_pool_connections=max(10, UPLOAD_CONCURRENCY * 2)),
+            )
+            self._transfer_config = TransferConfig(
+                multipart_threshold=S3_MULTIPART_BYTES,
+                multipart_chunksize=S3_MULTIPART_BYTES,
+            )
+        return self._client
+
+    def _key(self, key: str) -> str:
+        key = key.lstrip("/")
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None):
+        client = self._get_client()
+        extra_args = {"ContentType": content_type} if content_type else None
+        await run_in_threadpool(
+            client.upload_fileobj,
+            io.BytesIO(data),
+            self.bucket,
+            self._key(key),
+            ExtraArgs=extra_args,
+            Config=self._transfer_config,
+        )
+
+    async def get(self, key: str) -> bytes | None:
+        from botocore.exceptions import ClientError
+
+        def _read():
+            response = self._get_client().get_object(Bucket=self.bucket, Key=self._key(key))
+            return response["Body"].read()
+
+        try:
+            return await run_in_threadpool(_read)
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(
+                self._get_client().head_object, Bucket=self.bucket, Key=self._key(key)
+            )
+        except ClientError as e:
+            if self._is_missing(e):
+                return False
+            raise
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_replica_storage() -> Storage | None:
+    """
+    The optional replication backend, built from the environment on first use.
+
+    REPLICA_BACKEND=dropbox uses DROPBOX_TOKEN; REPLICA_BACKEND=s3 writes to
+    S3_BUCKET (optionally at S3_ENDPOINT_URL, for S3-compatible stores) and
+    needs boto3; REPLICA_BACKEND=local writes to REPLICA_DIR (a stand-in for
+    a remote store). Unset disables it, except that a configured
+    DROPBOX_TOKEN keeps the previous Dropbox behaviour.
+    """
+    backend = os.getenv("REPLICA_BACKEND", "").lower()
+    token = os.getenv("DROPBOX_TOKEN")
+
+    if backend == "local":
+        return LocalStorage(os.getenv("REPLICA_DIR", os.path.join(CACHE_DIR, "replica")))
+    if backend == "s3":
+        bucket = os.getenv("S3_BUCKET")
+        if not bucket:
+            raise ValueError("REPLICA_BACKEND=s3 requires S3_BUCKET to be set.")
+        if importlib.util.find_spec("boto3") is None:
+            raise ValueError("REPLICA_BACKEND=s3 requires the boto3 package.")
+        return S3Storage(
+            bucket,
+            prefix=os.getenv("S3_PREFIX", "cache"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            region=os.getenv("S3_REGION") or None,
+        )
+    if backend == "dropbox" or (not backend and token):
+        if not token:
+            raise ValueError("REPLICA_BACKEND=dropbox requires DROPBOX_TOKEN to be set.")
+        return DropboxStorage(token)
+    return None
+
+
+local_storage = LocalStorage(CACHE_DIR)
+
+# Strong references to in-flight replication tasks so they are not collected
+_replication_tasks: set[asyncio.Task] = set()
+# key -> digest of the bytes last replicated (or being replicated) under it,
+# bounded to REPLICATED_KEYS_MAX keys
+_replicated: OrderedDict[str, str] = OrderedDict()
+_upload_slots: asyncio.Semaphore | None = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    return _upload_slots
+
+
+async def _replicate(key: str, data: bytes, content_type: str | None, digest: str, content_addressed: bool):
+    replica = get_replica_storage()
+    try:
+        async with _slots():
+            # Another worker may already have sent the same immutable object
+            if content_addressed and await replica.exists(key):
+                UPLOADS.labels("skipped").inc()
+                return
+
+            for attempt in range(UPLOAD_RETRIES):
+                try:
+                    with stage_timer("upload"):
+                        await replica.put(key, data, content_type)
+                    UPLOADS.labels("uploaded").inc()
+                    return
+                except Exception:
+                    if attempt == UPLOAD_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(random.uniform(0, UPLOAD_BACKOFF_SECONDS * 2**attempt))
+    except Exception:
+        UPLOADS.labels("failed").inc()
+        if _replicated.get(key) == digest:
+            del _replicated[key]
+        logger.exception("Replication of '%s' failed", key)
+
+
+def replicate_in_background(
+    key: str, data: bytes, content_type: str | None = None, content_addressed: bool = False
+):
+    """
+    Copy an artifact to the replica backend without blocking the caller.
+    Uploads run at most UPLOAD_CONCURRENCY at a time and are retried with
+    jittered backoff. Bytes identical to what was last sent under ``key``
+    are skipped; pass ``content_addressed`` when the key names its content,
+    so objects already in the replica are skipped too.
+    Does nothing when no replica is configured. When UPLOAD_QUEUE_MAX
+    uploads are already pending the artifact is dropped, not queued.
+    """
+    if get_replica_storage() is None:
+        return None
+
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if _replicated.get(key) == digest:
+        _replicated.move_to_end(key)
+        UPLOADS.labels("skipped").inc()
+        return None
+    if len(_replication_tasks) >= UPLOAD_QUEUE_MAX:
+        UPLOADS.labels("dropped").inc()
+        logger.warning("Replication queue is full; not replicating '%s'", key)
+        return None
+
+    _replicated[key] = digest
+    _replicated.move_to_end(key)
+    if len(_replicated) > REPLICATED_KEYS_MAX:
+        _replicated.popitem(last=False)
+
+    task = asyncio.create_task(_replicate(key, data, content_type, digest, content_addressed))
+    _replication_tasks.add(task)
+    task.add_done_callback(_replication_tasks.discard)
+    return task
+
+
+async def drain_replication(timeout: float = 10.0):
+    """
+    Wait (up to ``timeout`` seconds) for queued uploads, e.g. at shutdown.
+    """
+    if _replication_tasks:
+        await asyncio.wait(set(_replication_tasks), timeout=timeout)
@@ -0,0 +1,361 @@
+import asyncio, hashlib, io, json, logging, multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from api.utils.metrics import stage_timer
+from api.utils.storage import local_storage, replicate_in_background
+
+
+logger = logging.getLogger(__name__)
+
+
+SUMMARY_PREFIX = "summary"
+# Holds the digest of the most recent image so every worker can find it
+SUMMARY_POINTER_KEY = f"{SUMMARY_PREFIX}/latest"
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "1"))
+
+SUMMARY_WIDTH, SUMMARY_HEIGHT = 800, 500
+# Tried in order; Pillow's built-in font is the last resort
+SUMMARY_FONT_PATHS = [
+    path.strip()
+    for path in os.getenv("SUMMARY_FONT_PATHS", "arial.ttf,DejaVuSans.ttf").split(",")
+    if path.strip()
+]
+# Widths served by ?w=; other requests are snapped up to the next one
+SUMMARY_IMAGE_WIDTHS = sorted(
+    int(width) for width in os.getenv("SUMMARY_IMAGE_WIDTHS", "160,320,400,640,800").split(",")
+)
+
+# format -> (Pillow format, media type, encoder options)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", "image/avif", {"quality": 60}),
+}
+
+
+class SummaryImage:
+    __slots__ = ("digest", "path", "etag", "media_type")
+
+    def __init__(self, digest: str, path: str, media_type: str = "image/png", etag: str | None = None):
+        self.digest = digest
+        self.path = path
+        self.etag = etag or f'"{digest}"'
+        self.media_type = media_type
+
+
+def summary_image_key(digest: str) -> str:
+    return f"{SUMMARY_PREFIX}/{digest}.png"
+
+
+def summary_input_key(input_digest: str) -> str:
+    return f"{SUMMARY_PREFIX}/inputs/{input_digest}"
+
+
+def summary_variant_key(digest: str, image_format: str, width: int) -> str:
+    return f"{SUMMARY_PREFIX}/variants/{digest}-{width}.{image_format}"
+
+
+def summary_input_digest(summary: dict) -> str:
+    """
+    Hash of everything drawn on the image, so an unchanged summary can
+    reuse the previous render.
+    """
+    payload = [
+        summary["total_countries"],
+        [[name, gdp] for name, gdp in summary["top_countries"]],
+        summary["last_refreshed_at"].isoformat() if summary["last_refreshed_at"] else None,
+    ]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+_current: SummaryImage | None = None
+_pointer_mtime: float | None = None
+_lock = threading.Lock()
+
+
+async def _point_at(digest: str) -> SummaryImage:
+    global _current
+
+    await local_storage.put(SUMMARY_POINTER_KEY, digest.encode(), "text/plain")
+    with _lock:
+        _current = SummaryImage(digest, str(local_storage.path_for(summary_image_key(digest))))
+        return _current
+
+
+async def store_summary_image(data: bytes) -> SummaryImage:
+    """
+    Save a rendered PNG under its content hash in the local cache, point
+    ``summary/latest`` at it and replicate it in the background.
+    Identical renders reuse the existing file.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    key = summary_image_key(digest)
+
+    if not await local_storage.exists(key):
+        await local_storage.put(key, data, "image/png")
+    image = await _point_at(digest)
+
+    replicate_in_background(key, data, "image/png", content_addressed=True)
+    return image
+
+
+def current_summary_image() -> SummaryImage | None:
+    """
+    Return the latest summary image, re-reading the pointer only when
+    another worker has replaced it since we last looked.
+    """
+    global _current, _pointer_mtime
+
+    pointer = local_storage.path_for(SUMMARY_POINTER_KEY)
+    try:
+        mtime = os.stat(pointer).st_mtime
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        if _current is not None and mtime == _pointer_mtime:
+            return _current
+
+        digest = pointer.read_text().strip()
+        path = local_storage.path_for(summary_image_key(digest))
+        if not path.is_file():
+            return None
+
+        _current = SummaryImage(digest, str(path))
+        _pointer_mtime = mtime
+        return _current
+
+
+# --- Render worker side: everything below runs in the process pool ---
+
+
+@lru_cache(maxsize=None)
+def _fonts():
+    """
+    Title and body fonts, loaded once per render worker.
+    """
+    # Imported here so only render workers pay for Pillow
+    from PIL import ImageFont
+
+    for path in SUMMARY_FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, 28), ImageFont.truetype(path, 20)
+        except OSError:
+            continue
+    logger.warning(
+        "None of the summary fonts (%s) could be loaded; using Pillow's default font",
+        ", ".join(SUMMARY_FONT_PATHS),
+    )
+    return ImageFont.load_default(28), ImageFont.load_default(20)
+
+
+@lru_cache(maxsize=None)
+def _template():
+    """
+    Background with the static text already drawn, copied by every render.
+    """
+    from PIL import Image, ImageDraw
+
+    font_title, font_text = _fonts()
+    img = Image.new("RGB", (SUMMARY_WIDTH, SUMMARY_HEIGHT), color=(240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    draw.text((50, 40), "Countries Summary", fill="black", font=font_title)
+    draw.text((50, 140), "Top 5 by Estimated GDP:", fill="black", font=font_text)
+    return img
+
+
+def render_summary_png(
+    total_countries: int,
+    top_countries: list[tuple[str, float]],
+    last_refreshed_at: datetime,
+) -> bytes:
+    """
+    Draw the summary image and return it PNG-encoded.
+    Pure and picklable so it can run in the render process pool.
+    """
+    from PIL import ImageDraw
+
+    _, font_text = _fonts()
+    img = _template().copy()
+    draw = ImageDraw.Draw(img)
+
+    draw.text(
+        (50, 100),
+        f"Total Countries: {total_countries}",
+        fill="black",
+        font=font_text,
+    )
+
+    y = 180
+    for idx, (name, gdp) in enumerate(top_countries, start=1):
+        draw.text(
+            (70, y), f"{idx}. {name} — {gdp:,.1f}", fill="black", font=font_text
+        )
+        y += 30
+
+    draw.text(
+        (50, y + 30),
+        f"Last Refreshed: {last_refreshed_at.isoformat()}Z",
+        fill="gray",
+        font=font_text,
+    )
+
+    image_bytes = io.BytesIO()
+    img.save(image_bytes, format="PNG")
+    return image_bytes.getvalue()
+
+
+def encode_variant(png: bytes, image_format: str, width: int) -> bytes:
+    """
+    Re-encode a summary PNG as ``image_format``, scaled down to ``width``.
+    """
+    from PIL import Image
+
+    pillow_format, _, options = IMAGE_FORMATS[image_format]
+    img = Image.open(io.BytesIO(png))
+    if width < img.width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+
+    image_bytes = io.BytesIO()
+    img.save(image_bytes, format=pillow_format, **options)
+    return image_bytes.getvalue()
+
+
+@lru_cache(maxsize=None)
+def supported_formats() -> tuple[str, ...]:
+    """
+    Formats this Pillow build can encode (AVIF needs libavif).
+    """
+    from PIL import features
+
+    return tuple(f for f in IMAGE_FORMATS if f == "png" or features.check(f))
+
+
+# --- Event loop side ---
+
+
+_render_pool: ProcessPoolExecutor | None = None
+# Strong references to scheduled renders so they are not collected
+_render_tasks: set[asyncio.Task] = set()
+# Variant encodes in flight, so concurrent requests share one
+_variant_tasks: dict[str, asyncio.Task] = {}
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn, not fork: the parent has an event loop and DB pool threads
+        _render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+async def in_render_pool(func, *args):
+    """
+    Run ``func(*args)`` in the render process pool. Shared by every
+    Pillow job (summary, variants, flags), which bounds their CPU use.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_render_pool(), func, *args)
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool and retry once
+        shutdown_render_pool()
+        return await loop.run_in_executor(get_render_pool(), func, *args)
+
+
+async def render_summary(summary: dict) -> SummaryImage:
+    """
+    Render the summary in the process pool, off the event loop, and store it.
+    ``summary`` holds total_countries, top_countries and last_refreshed_at.
+    When the same figures were rendered before, that image is reused.
+    """
+    input_digest = summary_input_digest(summary)
+
+    with stage_timer("render"):
+        known = await local_storage.get(summary_input_key(input_digest))
+        if known and await local_storage.exists(summary_image_key(known.decode())):
+            return await _point_at(known.decode())
+
+        data = await in_render_pool(
+            render_summary_png,
+            summary["total_countries"],
+            summary["top_countries"],
+            summary["last_refreshed_at"],
+        )
+        image = await store_summary_image(data)
+        await local_storage.put(summary_input_key(input_digest), image.digest.encode(), "text/plain")
+        return image
+
+
+def snap_width(width: int | None) -> int:
+    """
+    The smallest configured width at least ``width`` (the largest if none is).
+    """
+    if width is None:
+        return SUMMARY_IMAGE_WIDTHS[-1]
+    for allowed in SUMMARY_IMAGE_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return SUMMARY_IMAGE_WIDTHS[-1]
+
+
+async def _build_variant(image: SummaryImage, image_format: str, width: int, key: str):
+    png = await local_storage.get(summary_image_key(image.digest))
+    data = await in_render_pool(encode_variant, png, image_format, width)
+    await local_storage.put(key, data, IMAGE_FORMATS[image_format][1])
+
+
+async def summary_variant(image: SummaryImage, image_format: str, width: int) -> SummaryImage:
+    """
+    ``image`` encoded as ``image_format`` at ``width`` pixels wide. Each
+    variant is encoded once per image and then served from the cache.
+    """
+    media_type = IMAGE_FORMATS[image_format][1]
+    if image_format == "png" and width >= SUMMARY_WIDTH:
+        return image
+
+    key = summary_variant_key(image.digest, image_format, width)
+    if not await local_storage.exists(key):
+        task = _variant_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(_build_variant(image, image_format, width, key))
+            _variant_tasks[key] = task
+            task.add_done_callback(lambda _: _variant_tasks.pop(key, None))
+        await asyncio.shield(task)
+
+    return SummaryImage(
+        image.digest,
+        str(local_storage.path_for(key)),
+        media_type,
+        etag=f'"{image.digest}-{width}-{image_format}"',
+    )
+
+
+async def _render_logged(summary: dict):
+    try:
+        await render_summary(summary)
+    except Exception:
+        logger.exception("Summary image render failed")
+
+
+def schedule_summary_render(summary: dict) -> asyncio.Task:
+    """
+    Start rendering in the background so it overlaps with the response.
+    """
+    task = asyncio.create_task(_render_logged(summary))
+    _render_tasks.add(task)
+    task.add_done_callback(_render_tasks.discard)
+    return task
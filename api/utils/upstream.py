@@ -0,0 +1,158 @@
+import hashlib, json, logging, os, time
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.v1.models.system_meta import SystemMeta
+from api.utils.storage import local_storage
+
+
+load_dotenv(".env.config")
+
+logger = logging.getLogger(__name__)
+
+COUNTRIES_URL = os.getenv(
+    "COUNTRIES_URL",
+    "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies",
+)
+EXCHANGE_URL = os.getenv("EXCHANGE_URL", "https://open.er-api.com/v6/latest/USD")
+
+# SystemMeta key holding a document's validators as compact JSON
+VALIDATORS_KEY_PREFIX = "upstream:"
+# Storage key prefix of the last raw body of each document
+SNAPSHOT_PREFIX = "upstream"
+# SystemMeta key holding the digests of the documents country_data was last
+# written from; a refresh is only skipped when they match
+APPLIED_KEY = "upstream_applied"
+
+
+class UpstreamDocument:
+    """
+    One upstream payload plus what is needed to fetch it conditionally
+    next time. ``changed`` is False when the body matches the stored
+    snapshot, whether the server said 304 or sent the same bytes again.
+    ``stale`` marks a snapshot served because the upstream was unreachable.
+    """
+
+    __slots__ = ("name", "body", "digest", "changed", "stale", "validators")
+
+    def __init__(self, name: str, body: bytes, changed: bool, validators: dict, stale: bool = False):
+        self.name = name
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.changed = changed
+        self.stale = stale
+        self.validators = validators
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def snapshot_key(name: str) -> str:
+    return f"{SNAPSHOT_PREFIX}/{name}.json"
+
+
+async def load_validators(db: AsyncSession, name: str) -> dict:
+    meta = await db.get(SystemMeta, VALIDATORS_KEY_PREFIX + name)
+    if meta is None or not meta.value:
+        return {}
+    return json.loads(meta.value)
+
+
+async def save_validators(db: AsyncSession, document: UpstreamDocument):
+    """
+    Stage the document's validators in ``db``; the caller commits, so they
+    are only kept if the data they describe was written too.
+    """
+    value = json.dumps(
+        {k: v for k, v in document.validators.items() if v is not None},
+        separators=(",", ":"),
+    )
+    if len(value) > 255:
+        # An unusually long ETag; fall back to unconditional fetches
+        value = "{}"
+    await db.merge(SystemMeta(key=VALIDATORS_KEY_PREFIX + document.name, value=value))
+
+
+def applied_digests(documents) -> dict:
+    return {document.name: document.digest for document in documents}
+
+
+async def load_applied(db: AsyncSession) -> dict:
+    meta = await db.get(SystemMeta, APPLIED_KEY)
+    if meta is None or not meta.value:
+        return {}
+    return json.loads(meta.value)
+
+
+async def save_applied(db: AsyncSession, documents):
+    """
+    Stage the digests of the documents just written; the caller commits,
+    so they only ever describe data that is in the database.
+    """
+    value = json.dumps(applied_digests(documents), separators=(",", ":"), sort_keys=True)
+    await db.merge(SystemMeta(key=APPLIED_KEY, value=value))
+
+
+async def forget_applied(db: AsyncSession):
+    """
+    Stage dropping the applied digests, for a change made outside a refresh
+    (a delete), so the next refresh diffs every row again.
+    """
+    await db.execute(delete(SystemMeta).where(SystemMeta.key == APPLIED_KEY))
+
+
+async def save_snapshot(document: UpstreamDocument):
+    if document.changed:
+        await local_storage.put(snapshot_key(document.name), document.body, "application/json")
+
+
+async def fetch_document(get, name: str, url: str, validators: dict) -> UpstreamDocument:
+    """
+    Fetch ``url`` conditionally against the stored snapshot, using the
+    validators from ``load_validators``. ``get(url, headers)`` sends the
+    request, e.g. ``http_client.get_with_retry``.
+
+    No request is made while the document's ``time_next_update_unix`` is
+    in the future; otherwise If-None-Match/If-Modified-Since are sent and
+    a 304 reuses the snapshot. If the upstream fails and a snapshot exists,
+    the snapshot is returned marked stale; otherwise httpx errors are raised.
+    """
+    validators = dict(validators)
+    snapshot = await local_storage.get(snapshot_key(name))
+
+    if snapshot is not None:
+        next_update = validators.get("next_update")
+        if next_update and time.time() < next_update:
+            return UpstreamDocument(name, snapshot, False, validators)
+
+    headers = {}
+    if snapshot is not None:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        response = await get(url, headers=headers)
+        if response.status_code == 304 and snapshot is not None:
+            validators["etag"] = response.headers.get("ETag", validators.get("etag"))
+            return UpstreamDocument(name, snapshot, False, validators)
+        response.raise_for_status()
+
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        client_error = isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500
+        if snapshot is None or client_error:
+            raise
+        logger.warning("Upstream '%s' unavailable, using snapshot: %s", name, e)
+        return UpstreamDocument(name, snapshot, False, validators, stale=True)
+
+    body = response.content
+    payload = json.loads(body)
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "next_update": payload.get("time_next_update_unix") if isinstance(payload, dict) else None,
+    }
+    changed = snapshot is None or snapshot != body
+    return UpstreamDocument(name, body, changed, validators)
@@ -1,2 +1,4 @@
 from api.v1.models.country_data import CountryData
-from api.v1.models.system_meta import SystemMeta
\ No newline at end of file
+from api.v1.models.system_meta import SystemMeta
+from api.v1.models.country_aggregate import CountryAggregate
+from api.v1.models.exchange_rate_history import ExchangeRateHistory
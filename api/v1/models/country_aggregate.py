@@ -0,0 +1,22 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, String, Text
+from api.db.database import Base
+from datetime import datetime
+
+
+class CountryAggregate(Base):
+    """
+    Precomputed figures over country_data, rebuilt by every refresh and
+    delete. ``dimension`` is "total", "region" or "currency"; the total row
+    has an empty ``group_key`` and also carries the top countries by GDP.
+    """
+
+    __tablename__ = "country_aggregates"
+
+    dimension = Column(String(32), primary_key=True)
+    group_key = Column(String(255), primary_key=True, default="")
+    country_count = Column(Integer, nullable=False, default=0)
+    population_sum = Column(BigInteger, nullable=False, default=0)
+    gdp_sum = Column(Float, nullable=False, default=0.0)
+    top_countries = Column(Text, nullable=True)
+    last_refreshed_at = Column(DateTime, nullable=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
@@ -11,6 +11,7 @@ class CountryData(Base):
 
     country_id = Column(CHAR(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     country_name = Column(String(255), nullable=False)
+    name_key = Column(String(255), nullable=False, unique=True, index=True)
     capital = Column(String(255), nullable=True)
     region = Column(String(255), nullable=True)
     population = Column(Integer, nullable=False)
@@ -18,4 +19,5 @@ class CountryData(Base):
     exchange_rate = Column(Float, nullable=True)
     estimated_gdp = Column(Float, nullable=True)
     flag_url = Column(String(512), nullable=True)    
+    content_hash = Column(String(32), nullable=True)
     last_refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
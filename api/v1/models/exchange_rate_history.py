@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, Float, String
+from api.db.database import Base
+
+
+class ExchangeRateHistory(Base):
+    """
+    One USD-based rate per currency per upstream rates document, keyed by
+    the document's own update time so re-reading it adds nothing.
+    """
+
+    __tablename__ = "exchange_rate_history"
+
+    currency_code = Column(String(10), primary_key=True)
+    recorded_at = Column(DateTime, primary_key=True)
+    rate = Column(Float, nullable=False)
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 from api.v1.routes.country_information import country_ops
+from api.v1.routes.exchange_rates import rate_ops
+from api.v1.routes.flags import flag_ops
 api_version_one = APIRouter()
 
 api_version_one.include_router(country_ops)
+api_version_one.include_router(rate_ops)
+api_version_one.include_router(flag_ops)
@@ -1,173 +1,429 @@
-from api.utils.country_tools import refresh_countries_data, dbx, DROPBOX_ACCESS_TOKEN, DROPBOX_PATH
-from fastapi.responses import JSONResponse, StreamingResponse
+from api.utils.aggregates import aggregate_to_dict, read_group, read_total, rebuild_aggregates
+from api.utils.http_client import upstream_stats
+from api.utils.upstream import forget_applied
+from api.utils.refresh_jobs import get_job, start_refresh
+from api.utils.normalize import normalize_name
+from api.utils.country_snapshot import get_snapshot
+from api.utils.search_index import get_search_index
+from api.utils.compression import compressed_file, negotiate, variant_etag
+from api.utils.country_export import (
+    COLUMNAR_FORMATS,
+    columnar_available,
+    export_etag,
+    get_export,
+)
+from api.utils.summary_image import (
+    current_summary_image,
+    snap_width,
+    summary_variant,
+    supported_formats,
+)
+from api.utils.country_query import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    dumps,
+    parse_fields,
+    resolve_sort,
+)
+from api.utils.response_cache import (
+    bump_generation,
+    cached_response,
+    coalesced,
+    current_generation,
+    etag_matches,
+    make_cache_key,
+    response_cache,
+)
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, Request, status, Query
 from api.v1.models.country_data import CountryData
-from api.db.database import get_db, get_async_db
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-import httpx, requests, io
+from api.v1.schemas.country_info import CountryInfo, CountryPage, CountryProjection, CountryStatus
+from api.db.database import get_async_db
+from sqlalchemy import select
 
 country_ops = APIRouter(tags=["Countries"])
 
 
-@country_ops.post("/countries/refresh", status_code=status.HTTP_200_OK)
-async def refresh_countries_endpoint(db: AsyncSession = Depends(get_async_db)):
+@country_ops.post("/countries/refresh", status_code=status.HTTP_202_ACCEPTED)
+async def refresh_countries_endpoint(
+    seed: int | None = Query(
+        None,
+        ge=0,
+        description="Seed for the GDP estimates; every row's estimate is redrawn from it",
+    ),
+):
     """
-    Asynchronously fetches all countries and exchange rates, then updates or caches
-    them in the database.
+    Starts a background refresh of countries and exchange rates and returns its
+    job id. If a refresh is already running in any worker, that job is returned.
+
+    With ``seed`` the refresh runs even if upstream is unchanged and rewrites
+    the estimated GDP of every country from that seed, reproducing the
+    estimates of any refresh that reported the same seed.
     """
-    try:
-        total = await refresh_countries_data(db)
-        return {
-            "message": "Countries data refreshed successfully.",
-            "total_cached": total,
-        }
+    job, started = await start_refresh("api", seed)
+    return ORJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "message": "Refresh started." if started else "Refresh already in progress.",
+            **job,
+            "status_url": f"/countries/refresh/{job['job_id']}",
+        },
+    )
 
-    except HTTPException as e:
-        # Pass through known FastAPI exceptions
-        raise e
 
-    except Exception as e:
-        # Handle unexpected errors gracefully
+@country_ops.get("/countries/refresh/{job_id}", status_code=status.HTTP_200_OK)
+async def get_refresh_job(job_id: str):
+    """
+    Returns the status of a refresh job: queued, running, succeeded, failed or skipped.
+    """
+    job = await get_job(job_id)
+    if job is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to refresh countries data: {str(e)}",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Refresh job not found"},
         )
+    return job
 
 
-@country_ops.get("/countries", status_code=status.HTTP_200_OK)
-def get_all_countries(
+@country_ops.get(
+    "/countries",
+    status_code=status.HTTP_200_OK,
+    response_model=list[CountryProjection] | CountryPage,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "A JSON array, a CountryPage with limit/cursor, or one "
+            "country per line with format=ndjson (next cursor in X-Next-Cursor)",
+        }
+    },
+)
+async def get_all_countries(
+    request: Request,
     region: str | None = Query(None, description="Filter by region"),
     currency: str | None = Query(None, description="Filter by currency code"),
     sort: str | None = Query(None, description="Sort by GDP: gdp_asc or gdp_desc"),
-    db: Session = Depends(get_db),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to include, e.g. name,estimated_gdp"
+    ),
+    limit: int | None = Query(
+        None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables cursor pagination"
+    ),
+    cursor: str | None = Query(None, description="next_cursor from a previous page"),
+    output_format: str = Query(
+        "json", alias="format", pattern="^(json|ndjson)$", description="json or ndjson"
+    ),
+    base: str = Query(
+        "USD", min_length=3, max_length=3, description="Currency to express estimated_gdp in"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # --- Base Query ---
-    query = db.query(CountryData)
-
-    # --- Filters ---
-    if region:
-        query = query.filter(CountryData.region.ilike(f"%{region}%"))
-    if currency:
-        query = query.filter(CountryData.currency_code == currency)
-
-    # --- Sorting ---
-    if sort == "gdp_asc":
-        query = query.order_by(CountryData.estimated_gdp.asc())
-    elif sort == "gdp_desc":
-        query = query.order_by(desc(CountryData.estimated_gdp))
-    else:
-        query = query.order_by(CountryData.country_name.asc())
-
-    countries = query.all()
-
-    # --- Error Handling ---
-    if not countries:
+    """
+    List countries with optional filters and sorting.
+
+    Answered from the in-memory country snapshot, whose rows are already
+    serialized; the database is only read when a refresh or delete has
+    produced a new generation.
+
+    ``base`` converts estimated_gdp (and exchange_rate) from USD with the
+    stored rates. Without ``limit``/``cursor`` the full result set is returned. With
+    them, a single keyset-paginated page is returned together with the
+    ``next_cursor`` for the following page.
+    """
+    selected = parse_fields(fields)
+    sort_name = resolve_sort(sort)
+    base = base.upper()
+    # The cache key and the query must see the same region
+    region = (region or "").strip().lower() or None
+
+    # --- Cache ---
+    cache_key = make_cache_key(
+        "/countries",
+        region=region,
+        currency=currency,
+        sort=sort_name,
+        fields=",".join(selected),
+        limit=limit,
+        cursor=cursor,
+        format=output_format,
+        base=base,
+    )
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
+
+    async def build(session: AsyncSession):
+        snapshot = await get_snapshot(session, generation)
+        if base not in snapshot.rates:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": "Unknown base currency",
+                    "details": f"No exchange rate is stored for '{base}'.",
+                },
+            )
+
+        paginated = limit is not None or cursor is not None
+        page_size = (limit or DEFAULT_PAGE_SIZE) if paginated else None
+        media_type = "application/x-ndjson" if output_format == "ndjson" else "application/json"
+
+        positions, next_cursor = snapshot.query(region, currency, sort_name, cursor, page_size)
+
+        # --- Error Handling ---
+        if not positions and cursor is None:
+            raise HTTPException(
+                status_code=404, detail="No countries found matching criteria."
+            )
+
+        body = snapshot.serialize(positions, selected, output_format, base)
+        if paginated and output_format == "json":
+            body = b'{"data":' + body + b',"next_cursor":' + dumps(next_cursor) + b"}"
+
+        headers = None
+        if next_cursor and output_format == "ndjson":
+            headers = {"X-Next-Cursor": next_cursor}
+        return body, media_type, headers
+
+    # Identical concurrent misses share one build
+    return await cached_response(request, await coalesced(cache_key, generation, build))
+
+
+@country_ops.get("/countries/image", status_code=status.HTTP_200_OK)
+async def get_summary_image(
+    request: Request,
+    format: str = Query("png", pattern="^(png|webp|avif)$", description="png, webp or avif"),
+    w: int | None = Query(None, ge=1, description="Width in pixels, snapped to a served size"),
+):
+    """
+    Serve the latest summary image from the local cache, optionally
+    re-encoded and scaled down. Each format and width is encoded once.
+    """
+    image = current_summary_image()
+    if image is None:
+        return ORJSONResponse(status_code=404, content={"error": "Image not found"})
+
+    if format != "png" and format not in supported_formats():
         raise HTTPException(
-            status_code=404, detail="No countries found matching criteria."
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "Unsupported image format",
+                "details": f"This server can encode: {', '.join(supported_formats())}.",
+            },
         )
+    image = await summary_variant(image, format, snap_width(w))
+
+    headers = {
+        "ETag": image.etag,
+        "Cache-Control": "public, max-age=0, must-revalidate",
+    }
+    if etag_matches(request, image.etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(image.path, media_type=image.media_type, headers=headers)
+
+
+@country_ops.get(
+    "/countries/search", status_code=status.HTTP_200_OK, response_model=list[CountryProjection]
+)
+async def search_countries(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Name fragment to search for"),
+    mode: str = Query(
+        "substring", pattern="^(prefix|substring)$", description="prefix or substring"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of matches"),
+    fields: str | None = Query(None, description="Comma-separated fields to include"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Search countries by name. Prefix matches are listed before other
+    substring matches; both are answered from an in-memory index.
+    """
+    selected = parse_fields(fields)
+
+    cache_key = make_cache_key(
+        "/countries/search",
+        q=normalize_name(q),
+        mode=mode,
+        limit=limit,
+        fields=",".join(selected),
+    )
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
+
+    async def build(session: AsyncSession):
+        keys = (await get_search_index(session, generation)).search(q, mode, limit)
+        snapshot = await get_snapshot(session, generation)
 
-    # --- Response Formatting ---
-    response = []
-    for country in countries:
-        response.append({
-            "id": country.country_id,
-            "name": country.country_name,
-            "capital": country.capital,
-            "region": country.region,
-            "population": country.population,
-            "currency_code": country.currency_code,
-            "exchange_rate": country.exchange_rate,
-            "estimated_gdp": country.estimated_gdp,
-            "flag_url": country.flag_url,
-            "last_refreshed_at": country.last_refreshed_at
+        positions = [p for p in map(snapshot.position_of, keys) if p is not None]
+        return snapshot.serialize(positions, selected), "application/json", None
+
+    return await cached_response(request, await coalesced(cache_key, generation, build))
+
+
+@country_ops.get("/countries/stats", status_code=status.HTTP_200_OK)
+async def get_country_stats(
+    request: Request,
+    group_by: str = Query(
+        "region", pattern="^(region|currency)$", description="region or currency"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Country count, population and estimated GDP totals per region or currency,
+    served from the aggregates maintained by refresh and delete.
+    """
+    cache_key = make_cache_key("/countries/stats", group_by=group_by)
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
+
+    async def build(session: AsyncSession):
+        groups = await read_group(session, group_by)
+        body = dumps({
+            "group_by": group_by,
+            "groups": [aggregate_to_dict(group) for group in groups],
         })
+        return body, "application/json", None
 
-    return response
+    return await cached_response(request, await coalesced(cache_key, generation, build))
 
 
-@country_ops.get("/countries/image", status_code=status.HTTP_200_OK)
-def get_summary_image():
-    try:
-        dbx.files_get_metadata(DROPBOX_PATH)
-        links = dbx.sharing_list_shared_links(path=DROPBOX_PATH).links
-        if not links:
-            return JSONResponse(status_code=404, content={"error": "Image not found"})
-
-        shared_url = links[0].url.replace("?dl=0", "?raw=1")
-
-        # Fetch the image bytes
-        response = requests.get(shared_url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=404, detail="Image not accessible")
-
-        # Stream the actual image data
-        return StreamingResponse(
-            io.BytesIO(response.content),
-            media_type="image/png",  # or "image/jpeg" depending on your file
+@country_ops.get("/countries/export", status_code=status.HTTP_200_OK)
+async def export_countries(
+    request: Request,
+    format: str = Query(
+        "csv", pattern="^(csv|ndjson|parquet|arrow)$", description="csv, ndjson, parquet or arrow"
+    ),
+    fields: str | None = Query(None, description="Comma-separated fields to include"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Download every country as a file, ordered by name. Parquet and Arrow
+    are columnar and zstd-compressed (they need pyarrow installed).
+
+    Each export is written once per data generation, a batch of rows at a
+    time from the in-memory snapshot, then served from the local cache;
+    a matching If-None-Match is answered with 304 before any of that.
+    CSV and NDJSON are also kept compressed in the encoding clients ask for.
+    """
+    selected = parse_fields(fields)
+    if format in COLUMNAR_FORMATS and not columnar_available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "Unsupported export format",
+                "details": f"'{format}' exports require pyarrow, which is not installed.",
+            },
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Parquet and Arrow are compressed internally
+    encoding = None
+    if format not in COLUMNAR_FORMATS:
+        encoding = negotiate(request.headers.get("accept-encoding"))
+
+    generation = await current_generation(db)
+    etag = export_etag(generation, format, selected)
+    if encoding:
+        etag = variant_etag(etag, encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if format not in COLUMNAR_FORMATS:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
 
+    export = await get_export(await get_snapshot(db, generation), format, selected)
+    path = export.path
+    if encoding:
+        path = await compressed_file(export.path, encoding)
+        headers["Content-Encoding"] = encoding
+    return FileResponse(path, media_type=export.media_type, filename=export.filename, headers=headers)
 
-@country_ops.get("/countries/{name}", status_code=status.HTTP_200_OK)
-def get_country_by_name(name: str, db: Session = Depends(get_db)):
+
+@country_ops.get(
+    "/countries/{name}", status_code=status.HTTP_200_OK, response_model=CountryInfo
+)
+async def get_country_by_name(
+    name: str, request: Request, db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve a specific country by its name (case-insensitive).
+    Retrieve a specific country by its exact name (case- and accent-insensitive).
+    Use /countries/search for partial names.
     """
-    country = (
-        db.query(CountryData)
-        .filter(CountryData.country_name.ilike(f"%{name}%"))
-        .first()
-    )
-    if not country:
-        raise HTTPException(status_code=404, detail=f"Country '{name}' not found.")
+    name_key = normalize_name(name)
+    cache_key = make_cache_key("/countries/{name}", name=name_key)
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
 
-    return {
-        "id": country.country_id,
-        "name": country.country_name,
-        "capital": country.capital,
-        "region": country.region,
-        "population": country.population,
-        "currency_code": country.currency_code,
-        "exchange_rate": country.exchange_rate,
-        "estimated_gdp": country.estimated_gdp,
-        "flag_url": country.flag_url,
-        "last_refreshed_at": country.last_refreshed_at
-    }
+    async def build(session: AsyncSession):
+        snapshot = await get_snapshot(session, generation)
+        position = snapshot.position_of(name_key)
+        if position is None:
+            raise HTTPException(status_code=404, detail=f"Country '{name}' not found.")
+        return snapshot.row_json[position], "application/json", None
+
+    return await cached_response(request, await coalesced(cache_key, generation, build))
 
 
 @country_ops.delete("/countries/{name}", status_code=status.HTTP_200_OK)
-def delete_country(name: str, db: Session = Depends(get_db)):
+async def delete_country(name: str, db: AsyncSession = Depends(get_async_db)):
     """
-    Delete a country record by name.
+    Delete a country record by its exact name (case- and accent-insensitive).
     """
-    country = (
-        db.query(CountryData)
-        .filter(CountryData.country_name.ilike(f"%{name}%"))
-        .first()
+    result = await db.execute(
+        select(CountryData).where(CountryData.name_key == normalize_name(name))
     )
+    country = result.scalar_one_or_none()
 
     if not country:
         raise HTTPException(status_code=404, detail=f"Country '{name}' not found.")
 
-    db.delete(country)
-    db.commit()
+    await db.delete(country)
+    await db.flush()
+    await db.run_sync(rebuild_aggregates)
+    # The next refresh must restore the row, even from unchanged documents
+    await forget_applied(db)
+    generation = await db.run_sync(bump_generation)
+    await db.commit()
+    response_cache.observe_generation(generation)
 
     return {"message": f"Country '{country.country_name}' deleted successfully."}
 
-@country_ops.get("/status", status_code=status.HTTP_200_OK)
-def get_status(db: Session = Depends(get_db)):
+@country_ops.get("/status", status_code=status.HTTP_200_OK, response_model=CountryStatus)
+async def get_status(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
-    Return total countries and the most recent refresh timestamp.
+    Return total countries and the most recent refresh timestamp, read from
+    the precomputed aggregates.
     """
-    total_countries = db.query(func.count(CountryData.country_id)).scalar()
+    cache_key = make_cache_key("/status")
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
 
-    last_refresh = db.query(func.max(CountryData.last_refreshed_at)).scalar()
+    async def build(session: AsyncSession):
+        total = await read_total(session)
+        last_refresh = total.last_refreshed_at if total else None
 
-    return {
-        "total_countries": total_countries or 0,
-        "last_refreshed_at": (last_refresh.isoformat() + "Z" if last_refresh else None),
-    }
+        body = dumps({
+            "total_countries": total.country_count if total else 0,
+            "last_refreshed_at": (last_refresh.isoformat() + "Z" if last_refresh else None),
+        })
+        return body, "application/json", None
+
+    return await cached_response(request, await coalesced(cache_key, generation, build))
+
+
+@country_ops.get("/status/upstream", status_code=status.HTTP_200_OK)
+async def get_upstream_status():
+    """
+    Return per-host request, retry and hedge counters and circuit breaker state
+    for the upstream APIs, as seen by this worker.
+    """
+    return upstream_stats()
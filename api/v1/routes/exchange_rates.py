@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from api.utils.country_query import dumps
+from api.utils.rate_history import downsample, read_rate_history
+from api.utils.response_cache import (
+    cached_response,
+    coalesced,
+    current_generation,
+    make_cache_key,
+    response_cache,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException, Depends, Request, status, Query
+from api.db.database import get_async_db
+
+rate_ops = APIRouter(tags=["Exchange Rates"])
+
+
+def _naive_utc(moment: datetime | None) -> datetime | None:
+    # Stored times are naive UTC; an offset given in the query is converted
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@rate_ops.get("/rates/{code}/history", status_code=status.HTTP_200_OK)
+async def get_rate_history(
+    code: str,
+    request: Request,
+    start: datetime | None = Query(None, description="Earliest time, ISO 8601 (UTC)"),
+    end: datetime | None = Query(None, description="Latest time, ISO 8601 (UTC)"),
+    interval: str = Query(
+        "raw", pattern="^(raw|hour|day|week)$", description="raw, or bucket by hour, day or week"
+    ),
+    max_points: int = Query(500, ge=2, le=5000, description="Thin the series to at most this many points"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    USD exchange rate history of one currency, as recorded on each refresh,
+    optionally bucketed and thinned for charting.
+    """
+    code = code.upper()
+    # The same instant gives the same cache key whatever its offset
+    start, end = _naive_utc(start), _naive_utc(end)
+    cache_key = make_cache_key(
+        "/rates/{code}/history",
+        code=code,
+        start=start.isoformat() if start else None,
+        end=end.isoformat() if end else None,
+        interval=interval,
+        max_points=max_points,
+    )
+    generation = await current_generation(db)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return await cached_response(request, cached)
+
+    async def build(session: AsyncSession):
+        points = await read_rate_history(session, code, start, end)
+        if not points:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"error": "No rate history found", "details": f"No rates recorded for '{code}'."},
+            )
+
+        body = dumps({
+            "currency_code": code,
+            "base": "USD",
+            "interval": interval,
+            "points": downsample(points, interval, max_points),
+        })
+        return body, "application/json", None
+
+    return await cached_response(request, await coalesced(cache_key, generation, build))
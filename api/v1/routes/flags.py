@@ -0,0 +1,121 @@
+import json
+from api.utils.flag_assets import (
+    FLAG_FORMATS,
+    FLAG_THUMBNAIL_WIDTH,
+    current_flag_manifest,
+    sprite_index_key,
+    sprite_key,
+    thumbnail_key,
+)
+from api.utils.response_cache import etag_matches
+from api.utils.storage import local_storage
+from fastapi.responses import FileResponse, ORJSONResponse, Response
+from fastapi import APIRouter, HTTPException, Request, status, Query
+
+flag_ops = APIRouter(tags=["Flags"])
+
+# Versioned sprite URLs name content-addressed files, which never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+# A country's flag can change on refresh, though it rarely does
+FLAG_MAX_AGE = "public, max-age=86400"
+
+
+def _flags_not_cached():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "error": "Flags not cached yet",
+            "details": "Flags are downloaded in the background after a refresh.",
+        },
+    )
+
+
+@flag_ops.get("/flags/sprite.json", status_code=status.HTTP_200_OK)
+async def get_flag_sprite_index(request: Request):
+    """
+    Offsets of every flag in the sprite sheet, keyed by flag code, with
+    the cell size and versioned URLs of the sheet itself. Clients fetch
+    this and the sheet once to draw the flags of the whole country list.
+    """
+    manifest = current_flag_manifest()
+    if not manifest or not manifest.get("sprite"):
+        raise _flags_not_cached()
+
+    sprite_id = manifest["sprite"]
+    headers = {"ETag": f'"{sprite_id}"', "Cache-Control": "no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    index = json.loads(await local_storage.get(sprite_index_key(sprite_id)))
+    index["images"] = {
+        image_format: f"/flags/sprite?format={image_format}&v={sprite_id}"
+        for image_format in FLAG_FORMATS
+    }
+    return ORJSONResponse(content=index, headers=headers)
+
+
+@flag_ops.get("/flags/sprite", status_code=status.HTTP_200_OK)
+async def get_flag_sprite(
+    request: Request,
+    format: str = Query("png", pattern="^(png|webp)$", description="png or webp"),
+    v: str | None = Query(
+        None, pattern="^[0-9a-f]{32}$", description="Sprite version from /flags/sprite.json"
+    ),
+):
+    """
+    Every cached flag on one sheet. With ``v`` the response is cached for
+    good; without it the current sheet is revalidated by ETag.
+    """
+    sprite_id = v
+    if sprite_id is None:
+        manifest = current_flag_manifest()
+        sprite_id = manifest.get("sprite") if manifest else None
+        if sprite_id is None:
+            raise _flags_not_cached()
+
+    path = local_storage.path_for(sprite_key(sprite_id, format))
+    if not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Sprite not found", "details": f"No sprite sheet '{sprite_id}'."},
+        )
+
+    headers = {
+        "ETag": f'"{sprite_id}-{format}"',
+        "Cache-Control": IMMUTABLE if v else "no-cache",
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=FLAG_FORMATS[format][1], headers=headers)
+
+
+@flag_ops.get("/flags/{code}", status_code=status.HTTP_200_OK)
+async def get_flag(
+    code: str,
+    request: Request,
+    format: str = Query("png", pattern="^(png|webp)$", description="png or webp"),
+):
+    """
+    Thumbnail of one flag, served from the local cache. ``code`` is the
+    flag's file name in flag_url, e.g. ``ng`` for https://flagcdn.com/ng.svg.
+    """
+    manifest = current_flag_manifest()
+    flag = (manifest or {}).get("flags", {}).get(code.lower())
+    if not flag or not flag["digest"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Flag not found", "details": f"No cached flag for '{code}'."},
+        )
+
+    digest = flag["digest"]
+    headers = {
+        "ETag": f'"{digest[:32]}-{FLAG_THUMBNAIL_WIDTH}-{format}"',
+        "Cache-Control": FLAG_MAX_AGE,
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        local_storage.path_for(thumbnail_key(digest, format)),
+        media_type=FLAG_FORMATS[format][1],
+        headers=headers,
+    )
@@ -1,15 +1,42 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 from typing import Optional
 
 class CountryInfo(BaseModel):
-    country_name: str = Field(..., description="The name of the country")
+    """
+    A full country row, as served by /countries/{name}.
+    """
+
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+    id: str = Field(..., validation_alias=AliasChoices("id", "country_id"), description="Country id")
+    name: str = Field(..., validation_alias=AliasChoices("name", "country_name"), description="The name of the country")
     capital: Optional[str] = Field(None, description="The capital city of the country")
     region: Optional[str] = Field(None, description="The region where the country is located")
     population: int = Field(..., description="The population of the country")
-    currency_code: str = Field(..., description="The currency code of the country")
-    exchange_rate: float = Field(..., description="The country's exchange rate")
-    estimated_gdp: float = Field(..., description="The estimated GDP of the country")
+    currency_code: Optional[str] = Field(None, description="The currency code of the country")
+    exchange_rate: Optional[float] = Field(None, description="The country's exchange rate against USD")
+    estimated_gdp: Optional[float] = Field(None, description="The estimated GDP of the country")
     flag_url: Optional[str] = Field(None, description="URL to the country's flag image")
-    
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    last_refreshed_at: Optional[datetime] = Field(None, description="When the row was last written")
+
+
+class CountryProjection(CountryInfo):
+    """
+    A country as listed by /countries and /countries/search, where
+    ``fields=`` may leave out any key, including the otherwise required ones.
+    """
+
+    id: str = Field(None, description="Country id")
+    name: str = Field(None, description="The name of the country")
+    population: int = Field(None, description="The population of the country")
+
+
+class CountryPage(BaseModel):
+    data: list[CountryProjection]
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor= for the next page")
+
+
+class CountryStatus(BaseModel):
+    total_countries: int
+    last_refreshed_at: Optional[datetime] = None
@@ -0,0 +1,109 @@
+"""
+Compare the set-based bulk upsert against the legacy per-row loop on a
+local SQLite database.
+
+    python -m benchmarks.bench_bulk_upsert --rows 250 --rounds 5
+"""
+import argparse, os, random, statistics, tempfile, time
+
+os.environ.setdefault("DB_TYPE", "sqlite")
+
+from sqlalchemy import create_engine, func, event
+from sqlalchemy.orm import sessionmaker
+
+from api.db.database import Base
+from api.v1.models.country_data import CountryData
+from api.utils.bulk_upsert import bulk_upsert_countries
+from api.utils.normalize import normalize_name
+
+
+def synthetic_rows(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        population = rng.randint(10_000, 200_000_000)
+        rate = rng.uniform(0.3, 3000)
+        rows.append(
+            {
+                "country_name": f"Country {i:06d}",
+                "capital": f"Capital {i}",
+                "region": rng.choice(["Africa", "Americas", "Asia", "Europe", "Oceania"]),
+                "population": population,
+                "currency_code": f"C{i % 160:02d}",
+                "exchange_rate": rate,
+                "estimated_gdp": round(population * rng.uniform(1000, 2000) / rate, 1),
+                "flag_url": f"https://flagcdn.com/c{i}.svg",
+            }
+        )
+    return rows
+
+
+def legacy_upsert_countries(session, rows: list[dict]) -> None:
+    """
+    The per-row query-then-add loop that refresh_countries_data used to run.
+    """
+    for row in rows:
+        existing = (
+            session.query(CountryData)
+            .filter(func.lower(CountryData.country_name) == func.lower(row["country_name"]))
+            .first()
+        )
+        if existing:
+            for col, value in row.items():
+                setattr(existing, col, value)
+        else:
+            session.add(CountryData(name_key=normalize_name(row["country_name"]), **row))
+        # autoflush is off in SessionLocal, so flush to mirror one write per row
+        session.flush()
+
+
+def run(strategy, rows_per_round: list[list[dict]], db_path: str) -> tuple[list[float], int]:
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine, tables=[CountryData.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    timings = []
+    for rows in rows_per_round:
+        with Session() as session:
+            start = time.perf_counter()
+            strategy(session, rows)
+            session.commit()
+            timings.append(time.perf_counter() - start)
+
+    engine.dispose()
+    return timings, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=250)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # First round inserts everything, later rounds mostly update
+    rounds = [synthetic_rows(args.rows, seed) for seed in range(args.rounds)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "legacy per-row": run(legacy_upsert_countries, rounds, os.path.join(tmp, "legacy.db")),
+            "bulk upsert": run(bulk_upsert_countries, rounds, os.path.join(tmp, "bulk.db")),
+        }
+
+    print(f"{args.rows} rows x {args.rounds} rounds (SQLite)")
+    for name, (timings, statements) in results.items():
+        print(
+            f"  {name:<15} first={timings[0] * 1000:8.1f} ms  "
+            f"median={statistics.median(timings) * 1000:8.1f} ms  "
+            f"statements={statements}"
+        )
+
+
+if __name__ == "__main__":
+    main()
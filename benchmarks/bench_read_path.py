@@ -0,0 +1,152 @@
+"""
+Load-test the GET routes in-process on SQLite: the async read path
+against a copy of the previous sync-handler implementation.
+
+    python -m benchmarks.bench_read_path --rows 250 --concurrency 50 100 250 500
+"""
+import argparse, asyncio, os, statistics, tempfile, time
+
+_tmp = tempfile.mkdtemp(prefix="bench-read-")
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_URL", f"sqlite:///{_tmp}/bench.db")
+# Measure the database path, not response cache hits
+os.environ.setdefault("RESPONSE_CACHE_MAX_ENTRIES", "0")
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session, sessionmaker
+
+from api.db.database import Base, async_engine, db_engine
+from api.v1.models.country_data import CountryData
+from api.utils.bulk_upsert import bulk_upsert_countries
+from benchmarks.bench_bulk_upsert import synthetic_rows
+import main
+
+
+def build_legacy_app() -> FastAPI:
+    """
+    The sync ``def`` handlers on a pooled pymysql-style engine, as they
+    were before the async port.
+    """
+    engine = create_engine(
+        os.environ["DB_URL"],
+        connect_args={"check_same_thread": False},
+        pool_size=10,
+        max_overflow=20,
+    )
+    LegacySession = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    def get_db():
+        db = LegacySession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def to_dict(country):
+        return {
+            "id": country.country_id,
+            "name": country.country_name,
+            "capital": country.capital,
+            "region": country.region,
+            "population": country.population,
+            "currency_code": country.currency_code,
+            "exchange_rate": country.exchange_rate,
+            "estimated_gdp": country.estimated_gdp,
+            "flag_url": country.flag_url,
+            "last_refreshed_at": country.last_refreshed_at,
+        }
+
+    app = FastAPI()
+
+    @app.get("/countries")
+    def get_all_countries(region: str | None = None, db: Session = Depends(get_db)):
+        query = db.query(CountryData)
+        if region:
+            query = query.filter(CountryData.region.ilike(f"%{region}%"))
+        return [to_dict(c) for c in query.order_by(CountryData.country_name.asc()).all()]
+
+    @app.get("/countries/{name}")
+    def get_country_by_name(name: str, db: Session = Depends(get_db)):
+        country = db.query(CountryData).filter(CountryData.country_name.ilike(f"%{name}%")).first()
+        if not country:
+            raise HTTPException(status_code=404)
+        return to_dict(country)
+
+    @app.get("/status")
+    def get_status(db: Session = Depends(get_db)):
+        total = db.query(func.count(CountryData.country_id)).scalar()
+        last = db.query(func.max(CountryData.last_refreshed_at)).scalar()
+        return {"total_countries": total, "last_refreshed_at": last}
+
+    return app
+
+
+PATHS = [
+    "/countries?region=Africa",
+    "/countries/Country 000042",
+    "/status",
+]
+
+
+async def load(app, concurrency: int, requests_per_client: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    errors = 0
+
+    async def client_loop(client, offset):
+        nonlocal errors
+        for i in range(requests_per_client):
+            path = PATHS[(offset + i) % len(PATHS)]
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def run(args):
+    Base.metadata.create_all(bind=db_engine)
+    with Session(db_engine) as session:
+        bulk_upsert_countries(session, synthetic_rows(args.rows, seed=1))
+        session.commit()
+
+    apps = {"sync (before)": build_legacy_app(), "async (after)": main.app}
+
+    print(f"{args.rows} rows, {args.requests} requests per client")
+    for concurrency in args.concurrency:
+        for name, app in apps.items():
+            result = await load(app, concurrency, args.requests)
+            print(
+                f"  c={concurrency:<4} {name:<14} {result['rps']:8.0f} req/s  "
+                f"p50={result['p50_ms']:7.1f} ms  p99={result['p99_ms']:7.1f} ms  "
+                f"errors={result['errors']}"
+            )
+
+    await async_engine.dispose()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=250)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 100, 250, 500])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
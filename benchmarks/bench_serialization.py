@@ -0,0 +1,79 @@
+"""
+Per-request serialization cost of a /countries body: the FastAPI default
+path, stdlib json, orjson, and the snapshot's pre-serialized rows.
+
+    python -m benchmarks.bench_serialization --rows 250 --number 2000
+"""
+import argparse, json, os, timeit, uuid
+from datetime import datetime
+
+os.environ.setdefault("DB_TYPE", "sqlite")
+
+from fastapi.encoders import jsonable_encoder
+
+from api.utils.country_query import COUNTRY_FIELDS, dumps
+from api.utils.country_snapshot import CountrySnapshot
+from api.utils.normalize import normalize_name
+from benchmarks.bench_bulk_upsert import synthetic_rows
+
+
+def snapshot_records(count: int) -> list[tuple]:
+    now = datetime.utcnow()
+    records = []
+    for row in synthetic_rows(count, seed=5):
+        records.append(
+            (
+                normalize_name(row["country_name"]),
+                str(uuid.uuid4()),
+                row["country_name"],
+                row["capital"],
+                row["region"],
+                row["population"],
+                row["currency_code"],
+                row["exchange_rate"],
+                row["estimated_gdp"],
+                row["flag_url"],
+                now,
+            )
+        )
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=250)
+    parser.add_argument("--number", type=int, default=2000, help="iterations per case")
+    args = parser.parse_args()
+
+    snapshot = CountrySnapshot(snapshot_records(args.rows), generation=1)
+    fields = list(COUNTRY_FIELDS)
+    everything, _ = snapshot.query()
+    africa, _ = snapshot.query(region="africa")
+
+    def per_request_dicts(positions):
+        return [{f: snapshot.rows[p][f] for f in fields} for p in positions]
+
+    cases = {
+        # Hand-built dicts returned through FastAPI's default JSONResponse
+        "jsonable_encoder + json": lambda positions: json.dumps(
+            jsonable_encoder(per_request_dicts(positions)), separators=(",", ":")
+        ).encode(),
+        "dicts + json.dumps": lambda positions: json.dumps(
+            per_request_dicts(positions), default=str, separators=(",", ":")
+        ).encode(),
+        "dicts + orjson": lambda positions: dumps(per_request_dicts(positions)),
+        "pre-serialized rows": lambda positions: snapshot.serialize(positions, fields),
+    }
+
+    print(f"{args.rows} rows, mean of {args.number} iterations")
+    for label, positions in (("all countries", everything), ("region=africa", africa)):
+        print(f"  {label} ({len(positions)} rows)")
+        baseline = None
+        for name, build in cases.items():
+            seconds = timeit.timeit(lambda: build(positions), number=args.number) / args.number
+            baseline = baseline or seconds
+            print(f"    {name:<26} {seconds * 1e6:10.1f} us  {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
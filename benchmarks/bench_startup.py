@@ -0,0 +1,99 @@
+"""
+Worker startup cost: time from spawning uvicorn to the first answered
+request, and the worker's resident memory once it is serving.
+
+    python -m benchmarks.bench_startup --runs 5
+
+Runs against a throwaway SQLite database created with the current schema.
+RSS is read from /proc, so memory figures are Linux only.
+"""
+import argparse, os, socket, statistics, subprocess, sys, tempfile, time
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def measure(env: dict, path: str, timeout: float) -> tuple[float, float, float | None]:
+    """
+    Start one worker and return (seconds to first response on ``/``,
+    seconds to first response on ``path``, RSS in MiB).
+    """
+    port = free_port()
+    # One client made up front, so polling does not pay for client setup
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout, trust_env=False)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        while True:
+            try:
+                client.get("/").raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.perf_counter() > deadline or process.poll() is not None:
+                    raise RuntimeError("worker did not come up")
+                time.sleep(0.005)
+        first = time.perf_counter() - started
+
+        client.get(path)
+        first_data = time.perf_counter() - started
+        return first, first_data, rss_mb(process.pid)
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/countries?limit=1", help="first data request")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = {
+        **os.environ,
+        "DB_TYPE": "sqlite",
+        "DB_URL": f"sqlite:///{workdir}/startup.db",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "REFRESH_INTERVAL_SECONDS": "0",
+    }
+    # Schema comes from migrations in production; create_all is enough here
+    subprocess.run(
+        [sys.executable, "-c", "from api.v1.models import *; from api.db.database import create_database; create_database()"],
+        env=env,
+        check=True,
+    )
+
+    results = [measure(env, args.path, args.timeout) for _ in range(args.runs)]
+    first, first_data, rss = zip(*results)
+    print(f"{args.runs} runs, median")
+    print(f"  first response  {statistics.median(first) * 1000:8.0f} ms")
+    print(f"  first data      {statistics.median(first_data) * 1000:8.0f} ms  ({args.path})")
+    if None not in rss:
+        print(f"  worker RSS      {statistics.median(rss):8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
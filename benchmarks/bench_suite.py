@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark: a real uvicorn worker fed by the synthetic upstream,
+timed on a full refresh and then on replayed traffic. Writes a JSON report
+that later runs can be compared against.
+
+    python -m benchmarks.bench_suite --rows 25000 --latency-ms 50 \\
+        --rps 200 --duration 30 --output bench/report.json
+    python -m benchmarks.bench_suite --rows 25000 --baseline bench/report.json
+
+The report holds the refresh wall time (POST /countries/refresh until the
+job finishes), per-endpoint throughput and p50/p99 latency from
+benchmarks.replay after an unrecorded warm-up, and the worker's peak RSS.
+With --baseline, metrics that got worse by more than --tolerance are
+listed and the exit status is 1.
+
+Runs against a throwaway SQLite database; RSS is read from /proc (Linux).
+"""
+import argparse, asyncio, json, os, platform, subprocess, sys, tempfile, threading, time
+from datetime import datetime, timezone
+import httpx
+
+from benchmarks.bench_startup import free_port
+from benchmarks.replay import load_traffic, print_summary, replay, summarize
+from benchmarks.stub_upstream import serve
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    # VmHWM is the high-water mark of the resident set
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_until_up(client: httpx.Client, process: subprocess.Popen, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            client.get("/").raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.perf_counter() > deadline or process.poll() is not None:
+                raise RuntimeError("worker did not come up")
+            time.sleep(0.05)
+
+
+def time_refresh(client: httpx.Client, timeout: float) -> tuple[float, str]:
+    """
+    Seconds from starting a refresh to its job finishing, and its status.
+    """
+    started = time.perf_counter()
+    job = client.post("/countries/refresh").json()
+    while job["status"] in ("queued", "running"):
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError("refresh did not finish")
+        time.sleep(0.02)
+        job = client.get(f"/countries/refresh/{job['job_id']}").json()
+    return time.perf_counter() - started, job["status"]
+
+
+async def replay_measured(base_url: str, args):
+    traffic = load_traffic(args.traffic)
+    # Snapshot, indexes and the render pool are built on first use;
+    # keep that out of the measured run
+    if args.warmup > 0:
+        await replay(base_url, traffic, args.rps, args.warmup, args.timeout)
+    return await replay(base_url, traffic, args.rps, args.duration, args.timeout)
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    upstream_port, app_port = free_port(), free_port()
+
+    upstream = serve("127.0.0.1", upstream_port, args.rows, 0, args.latency_ms / 1000)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    env = {
+        **os.environ,
+        "DB_TYPE": "sqlite",
+        "DB_URL": f"sqlite:///{workdir}/bench.db",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "COUNTRIES_URL": f"http://127.0.0.1:{upstream_port}/countries",
+        "EXCHANGE_URL": f"http://127.0.0.1:{upstream_port}/rates",
+        "REFRESH_INTERVAL_SECONDS": "0",
+    }
+    # Schema comes from migrations in production; create_all is enough here
+    subprocess.run(
+        [sys.executable, "-c", "from api.v1.models import *; from api.db.database import create_database; create_database()"],
+        env=env,
+        check=True,
+    )
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=args.timeout, trust_env=False) as client:
+            wait_until_up(client, process, args.timeout)
+            refresh_seconds, refresh_status = time_refresh(client, args.timeout)
+            if refresh_status != "succeeded":
+                raise RuntimeError(f"refresh {refresh_status}")
+
+        samples, wall = asyncio.run(replay_measured(base_url, args))
+        rss = peak_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+        upstream.shutdown()
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "rows": args.rows,
+            "upstream_latency_ms": args.latency_ms,
+            "rps": args.rps,
+            "warmup_seconds": args.warmup,
+            "duration_seconds": args.duration,
+            "traffic": args.traffic,
+        },
+        "refresh_seconds": round(refresh_seconds, 3),
+        "peak_rss_mb": rss,
+        "endpoints": summarize(samples, wall),
+    }
+
+
+# metric -> True when bigger is better
+_COMPARED = {"p50_ms": False, "p99_ms": False, "throughput_rps": True}
+
+
+def _worse(old, new, higher_is_better: bool, tolerance: float) -> bool:
+    if old is None or new is None or old == 0:
+        return False
+    change = (new - old) / old
+    return change < -tolerance if higher_is_better else change > tolerance
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> list[str]:
+    """
+    Human-readable lines for every metric that regressed past ``tolerance``
+    (a fraction, 0.1 = 10%).
+    """
+    regressions = []
+    for key in ("refresh_seconds", "peak_rss_mb"):
+        old, new = baseline.get(key), report.get(key)
+        if _worse(old, new, False, tolerance):
+            regressions.append(f"{key}: {old} -> {new}")
+
+    for name, row in report["endpoints"].items():
+        old_row = baseline.get("endpoints", {}).get(name)
+        if old_row is None:
+            continue
+        for metric, higher_is_better in _COMPARED.items():
+            if _worse(old_row.get(metric), row.get(metric), higher_is_better, tolerance):
+                regressions.append(f"{name} {metric}: {old_row[metric]} -> {row[metric]}")
+        if row["errors"] > old_row.get("errors", 0):
+            regressions.append(f"{name} errors: {old_row.get('errors', 0)} -> {row['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=250, help="synthetic countries (250 to 250000)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="upstream response delay")
+    parser.add_argument(
+        "--traffic", default=os.path.join(os.path.dirname(__file__), "traffic.sample.jsonl")
+    )
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unrecorded replay")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of replay")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression (fraction)")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    print(f"refresh ({args.rows} rows)  {report['refresh_seconds'] * 1000:8.0f} ms")
+    if report["peak_rss_mb"] is not None:
+        print(f"peak worker RSS       {report['peak_rss_mb']:8.1f} MiB")
+    print_summary(report["endpoints"])
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as previous:
+            regressions = compare(json.load(previous), report, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Replay recorded traffic against a running server at a fixed request rate.
+
+    python -m benchmarks.replay http://127.0.0.1:8000 benchmarks/traffic.sample.jsonl \\
+        --rps 200 --duration 30
+
+Traffic is JSON Lines, one request per line:
+
+    {"method": "GET", "path": "/countries?region=Africa&sort=gdp_desc"}
+    {"method": "GET", "path": "/countries/Country%20000042", "name": "GET /countries/{name}"}
+
+``method`` defaults to GET, ``body`` is sent as JSON when present and
+``name`` groups requests in the report (by default the method and the
+path without its query string). Lines are replayed in order, looping
+until the duration is up.
+
+The load is open-loop: request i is sent at i / rps whether or not
+earlier ones have answered, and latency is measured from that scheduled
+time, so a stalled server shows up as latency instead of a lower rate.
+"""
+import argparse, asyncio, json, statistics, time
+import httpx
+
+
+def load_traffic(path: str) -> list[dict]:
+    traffic = []
+    with open(path) as lines:
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if "path" not in entry:
+                raise ValueError(f"{path}:{number}: every request needs a path")
+            entry.setdefault("method", "GET")
+            entry["method"] = entry["method"].upper()
+            entry.setdefault("name", f"{entry['method']} {entry['path'].split('?', 1)[0]}")
+            traffic.append(entry)
+    if not traffic:
+        raise ValueError(f"{path}: no requests")
+    return traffic
+
+
+async def replay(
+    base_url: str, traffic: list[dict], rps: float, duration: float, timeout: float = 30
+) -> tuple[list[tuple[str, int, float]], float]:
+    """
+    Send ``traffic`` at ``rps`` for ``duration`` seconds. Returns one
+    (name, status, latency seconds) per request, status 0 for transport
+    errors, and the wall time until the last answer.
+    """
+    samples = []
+    total = max(1, int(rps * duration))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=timeout, limits=limits, trust_env=False
+    ) as client:
+        started = time.perf_counter()
+
+        async def send(entry: dict, scheduled: float):
+            try:
+                response = await client.request(
+                    entry["method"], entry["path"], json=entry.get("body")
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((entry["name"], status, time.perf_counter() - scheduled))
+
+        tasks = []
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(traffic[i % len(traffic)], scheduled)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+
+    return samples, wall
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples: list[tuple[str, int, float]], wall: float) -> dict:
+    """
+    Per-endpoint request count, error count (status 0 or >= 500),
+    throughput and p50/p99/mean latency in milliseconds.
+    """
+    by_name: dict[str, list[tuple[int, float]]] = {}
+    for name, status, latency in samples:
+        by_name.setdefault(name, []).append((status, latency))
+    by_name["ALL"] = [(status, latency) for _, status, latency in samples]
+
+    report = {}
+    for name, results in sorted(by_name.items()):
+        latencies = [latency * 1000 for _, latency in results]
+        report[name] = {
+            "requests": len(results),
+            "errors": sum(1 for status, _ in results if status == 0 or status >= 500),
+            "throughput_rps": round(len(results) / wall, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+        }
+    return report
+
+
+def print_summary(report: dict):
+    print(f"{'endpoint':<40} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, row in report.items():
+        print(
+            f"{name:<40} {row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>8.1f}"
+            f" {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base_url")
+    parser.add_argument("traffic", help="JSON Lines file of requests")
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--output", help="also write the summary here as JSON")
+    args = parser.parse_args()
+
+    samples, wall = asyncio.run(replay(args.base_url, load_traffic(args.traffic), args.rps, args.duration))
+    report = summarize(samples, wall)
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
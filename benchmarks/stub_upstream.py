@@ -0,0 +1,197 @@
+"""
+Local stand-in for restcountries and open.er-api that honours conditional
+requests, for exercising the refresh without hitting the real services.
+
+    python -m benchmarks.stub_upstream --port 8099 --rows 250 --latency-ms 50
+    COUNTRIES_URL=http://127.0.0.1:8099/countries \\
+    EXCHANGE_URL=http://127.0.0.1:8099/rates uvicorn main:app
+
+GET /countries and /rates send ETag and Last-Modified and answer 304 to a
+matching If-None-Match or If-Modified-Since. GET /bump changes one country
+so the next refresh has something to write; GET /bump?rates=1 publishes a
+new rates document instead. --latency-ms delays every /countries and
+/rates answer, to stand in for a slow upstream.
+
+Flags point back at the stub: GET /flags/<code>.png returns a small
+generated PNG. Like real data there are at most 250 distinct flags.
+"""
+import argparse, hashlib, io, json, random, threading, time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_bulk_upsert import synthetic_rows
+
+
+class Document:
+    def __init__(self, payload):
+        self.set(payload)
+
+    def set(self, payload):
+        self.body = json.dumps(payload).encode()
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+        self.modified_at = int(time.time())
+        self.last_modified = formatdate(self.modified_at, usegmt=True)
+
+
+FLAG_CODES = 250
+
+
+def flag_png(code: str) -> bytes:
+    """
+    A 120x80 three-band flag whose colours are derived from ``code``.
+    """
+    from PIL import Image, ImageDraw
+
+    digest = hashlib.sha256(code.encode()).digest()
+    img = Image.new("RGB", (120, 80))
+    draw = ImageDraw.Draw(img)
+    for band in range(3):
+        colour = tuple(digest[band * 3 : band * 3 + 3])
+        draw.rectangle((band * 40, 0, band * 40 + 39, 79), fill=colour)
+    image_bytes = io.BytesIO()
+    img.save(image_bytes, format="PNG")
+    return image_bytes.getvalue()
+
+
+def build_documents(rows: int, rates_ttl: int, flag_base: str = "") -> tuple[Document, Document]:
+    countries = [
+        {
+            "name": row["country_name"],
+            "capital": row["capital"],
+            "region": row["region"],
+            "population": row["population"],
+            "flag": f"{flag_base}/flags/f{i % FLAG_CODES:03d}.png" if flag_base else row["flag_url"],
+            "currencies": [{"code": row["currency_code"]}],
+        }
+        for i, row in enumerate(synthetic_rows(rows, seed=7))
+    ]
+    now = int(time.time())
+    rates = {
+        "result": "success",
+        "base_code": "USD",
+        "time_last_update_unix": now,
+        "time_next_update_unix": now + rates_ttl,
+        "rates": {f"C{i:02d}": round(1.0 + i * 0.37, 4) for i in range(160)},
+    }
+    return Document(countries), Document(rates)
+
+
+def bump_rates(document: Document):
+    # Stamped now, but always strictly after the previous document
+    rates = json.loads(document.body)
+    ttl = rates["time_next_update_unix"] - rates["time_last_update_unix"]
+    rates["time_last_update_unix"] = max(int(time.time()), rates["time_last_update_unix"] + 1)
+    rates["time_next_update_unix"] = rates["time_last_update_unix"] + ttl
+    rates["rates"] = {
+        code: round(rate * random.uniform(0.98, 1.02), 4) for code, rate in rates["rates"].items()
+    }
+    document.set(rates)
+
+
+def make_handler(documents: dict, countries: list, lock: threading.Lock, latency: float = 0.0):
+    flags = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _not_modified(self, document: Document) -> bool:
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return if_none_match == document.etag
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since:
+                try:
+                    since = parsedate_to_datetime(if_modified_since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+                return document.modified_at <= since
+            return False
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+
+            if path == "/bump":
+                with lock:
+                    if "rates=1" in self.path:
+                        bump_rates(documents["/rates"])
+                    else:
+                        country = random.choice(countries)
+                        country["population"] += 1
+                        documents["/countries"].set(countries)
+                self.send_response(204)
+                self.end_headers()
+                return
+
+            if path.startswith("/flags/") and path.endswith(".png"):
+                code = path[len("/flags/") : -len(".png")]
+                with lock:
+                    if code not in flags:
+                        flags[code] = flag_png(code)
+                    body = flags[code]
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            document = documents.get(path)
+            if document is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            if latency:
+                time.sleep(latency)
+            with lock:
+                body, etag, last_modified = document.body, document.etag, document.last_modified
+                not_modified = self._not_modified(document)
+
+            self.send_response(304 if not_modified else 200)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            if not_modified:
+                self.end_headers()
+                return
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(
+    host: str, port: int, rows: int, rates_ttl: int, latency: float = 0.0
+) -> ThreadingHTTPServer:
+    countries_doc, rates_doc = build_documents(rows, rates_ttl, f"http://{host}:{port}")
+    countries = json.loads(countries_doc.body)
+    documents = {"/countries": countries_doc, "/rates": rates_doc}
+    handler = make_handler(documents, countries, threading.Lock(), latency)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rows", type=int, default=250)
+    parser.add_argument(
+        "--rates-ttl", type=int, default=0, help="seconds until time_next_update_unix"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="delay before every /countries and /rates answer"
+    )
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.rows, args.rates_ttl, args.latency_ms / 1000)
+    print(f"Serving {args.rows} countries on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main_cli()
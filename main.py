@@ -1,21 +1,41 @@
 import uvicorn
 from contextlib import asynccontextmanager
 from typing import Union
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from starlette.requests import Request
-from api.db.database import create_database
+from api.db.database import dispose_engines, start_replica_monitor
+from api.utils.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from api.utils.country_snapshot import warm_snapshot
+from api.utils.http_client import close_http_client, get_http_client
+from api.utils.metrics import METRICS_ENABLED, MetricsMiddleware, render_metrics
+from api.utils.refresh_jobs import start_scheduler
+from api.utils.storage import drain_replication, get_replica_storage
+from api.utils.summary_image import shutdown_render_pool
 from api.v1.routes import api_version_one
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_database()
+    # A misconfigured replica backend fails startup, not the first upload
+    get_replica_storage()
+    replica_monitor = start_replica_monitor()
+    await warm_snapshot()
+    get_http_client()
+    scheduler = start_scheduler()
     yield
     ## write shutdown logic below yield
+    for task in (scheduler, replica_monitor):
+        if task is not None:
+            task.cancel()
+    await drain_replication()
+    await close_http_client()
+    await dispose_engines()
+    shutdown_render_pool()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 
@@ -33,6 +53,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 app.include_router(api_version_one)
 # app.include_router(users, tags=["Users"])
@@ -46,5 +72,11 @@ async def get_root(request: Request) -> dict:
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", port=7001, reload=True)
@@ -0,0 +1,85 @@
+import os, tempfile, threading
+import pytest
+
+# Settings are read at import time, so point everything at throwaway local
+# stand-ins before any application module is loaded
+_workdir = tempfile.mkdtemp(prefix="countries_tests_")
+os.environ.update(
+    {
+        "DB_TYPE": "sqlite",
+        "DB_URL": f"sqlite:///{_workdir}/test.db",
+        "DB_REPLICA_URLS": "",
+        "CACHE_DIR": os.path.join(_workdir, "cache"),
+        "REPLICA_BACKEND": "",
+        "DROPBOX_TOKEN": "",
+        "REFRESH_INTERVAL_SECONDS": "0",
+        "FLAG_CACHE_ENABLED": "false",
+        "HTTP_BACKOFF_BASE": "0.01",
+        "ENRICHMENT_SEED": "",
+    }
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    # Async tests run through anyio's pytest plugin, on asyncio only
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    """
+    Empty tables in the test SQLite file, and the engine disposed afterwards
+    so no pooled connection outlives the test's event loop.
+    """
+    import api.v1.models  # noqa: F401  (registers the tables)
+    from api.db.database import Base, get_async_engine, get_db_engine
+
+    Base.metadata.drop_all(get_db_engine())
+    Base.metadata.create_all(get_db_engine())
+    yield
+    await get_async_engine().dispose()
+
+
+@pytest.fixture
+async def http_client(monkeypatch):
+    """
+    A fresh shared HTTP client and fresh per-host breakers for the test.
+    """
+    from api.utils import http_client
+
+    monkeypatch.setattr(http_client, "_hosts", {})
+    yield
+    await http_client.close_http_client()
+
+
+@pytest.fixture
+def local_cache(tmp_path, monkeypatch):
+    from api.utils.storage import local_storage
+
+    monkeypatch.setattr(local_storage, "root", (tmp_path / "cache").resolve())
+    return local_storage
+
+
+@pytest.fixture
+def stub_upstream(request):
+    """
+    benchmarks.stub_upstream on a free port. Mark a test with
+    ``@pytest.mark.upstream(rates_ttl=...)`` to change the rates document's
+    time_next_update_unix.
+    """
+    from benchmarks.bench_startup import free_port
+    from benchmarks.stub_upstream import serve
+
+    marker = request.node.get_closest_marker("upstream")
+    options = {"rows": 50, "rates_ttl": 0, **(marker.kwargs if marker else {})}
+
+    server = serve("127.0.0.1", free_port(), options["rows"], options["rates_ttl"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "upstream(rows, rates_ttl): stub upstream options")
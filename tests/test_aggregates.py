@@ -0,0 +1,38 @@
+import pytest
+from api.db.database import PrimarySessionLocal
+from api.utils.aggregates import read_group, rebuild_aggregates
+from api.utils.bulk_upsert import bulk_upsert_countries
+
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("database")]
+
+
+def country(name: str, region, currency, population: int) -> dict:
+    return {
+        "country_name": name,
+        "capital": None,
+        "region": region,
+        "population": population,
+        "currency_code": currency,
+        "exchange_rate": 1.0,
+        "estimated_gdp": 10.0,
+        "flag_url": None,
+    }
+
+
+async def test_missing_and_empty_groups_are_one_aggregate():
+    rows = [
+        country("Alpha", None, "AAA", 1),
+        country("Beta", "", None, 2),
+        country("Gamma", "Asia", "", 4),
+    ]
+    async with PrimarySessionLocal() as db:
+        await db.run_sync(bulk_upsert_countries, rows)
+        await db.run_sync(rebuild_aggregates)
+        await db.commit()
+
+        regions = {group.group_key: group.population_sum for group in await read_group(db, "region")}
+        currencies = {group.group_key: group.population_sum for group in await read_group(db, "currency")}
+
+    assert regions == {"": 3, "Asia": 4}
+    assert currencies == {"": 6, "AAA": 1}
@@ -0,0 +1,24 @@
+import os, time
+from api.utils.country_export import EXPORT_PREFIX, _prune_generations
+
+
+def write_generation(cache, generation: int, age: float):
+    path = cache.path_for(f"{EXPORT_PREFIX}/{generation}/countries.csv")
+    path.parent.mkdir(parents=True)
+    path.write_text("name\n")
+    stamp = time.time() - age
+    os.utime(path.parent, (stamp, stamp))
+
+
+def generations(cache) -> list[int]:
+    return sorted(int(child.name) for child in cache.path_for(EXPORT_PREFIX).iterdir())
+
+
+def test_prune_keeps_the_previous_and_recent_generations(local_cache):
+    for generation, age in ((1, 3600), (2, 3600), (3, 10), (4, 3600), (5, 0)):
+        write_generation(local_cache, generation, age)
+
+    _prune_generations(5)
+
+    # 3 is within the grace period, 4 is the generation just replaced
+    assert generations(local_cache) == [3, 4, 5]
@@ -0,0 +1,70 @@
+import asyncio
+import httpx
+import pytest
+from api.utils import http_client
+from api.utils.http_client import CircuitBreaker, CircuitOpenError, get_with_retry
+
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("http_client")]
+
+URL = "http://upstream.test/rates"
+
+
+def use_transport(monkeypatch, handler):
+    # Redirects are followed like the shared client does
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), follow_redirects=True, max_redirects=2
+    )
+    monkeypatch.setattr(http_client, "_client", client)
+
+
+def breaker_due_for_trial() -> CircuitBreaker:
+    # Open long enough ago that the next request is the half-open trial
+    breaker = http_client._host_stats(URL).breaker
+    breaker.state, breaker.opened_at = "open", 0.0
+    return breaker
+
+
+async def test_successful_trial_closes_a_half_open_breaker(monkeypatch):
+    use_transport(monkeypatch, lambda request: httpx.Response(200, json={}))
+    breaker = breaker_due_for_trial()
+
+    response = await get_with_retry(URL)
+
+    assert response.status_code == 200
+    assert breaker.state == "closed"
+
+
+async def test_cancelled_trial_reopens_the_breaker(monkeypatch):
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    use_transport(monkeypatch, hang)
+    breaker = breaker_due_for_trial()
+
+    trial = asyncio.create_task(get_with_retry(URL))
+    await asyncio.sleep(0.05)
+    assert breaker.state == "half_open"
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    # Not stuck half-open: open again, so a new trial follows reset_seconds
+    assert breaker.state == "open"
+    breaker.opened_at = 0.0
+    assert breaker.allow()
+
+
+async def test_unexpected_error_in_the_trial_reopens_the_breaker(monkeypatch):
+    def redirect_loop(request):
+        return httpx.Response(302, headers={"Location": URL})
+
+    use_transport(monkeypatch, redirect_loop)
+    breaker = breaker_due_for_trial()
+
+    with pytest.raises(httpx.TooManyRedirects):
+        await get_with_retry(URL)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await get_with_retry(URL)
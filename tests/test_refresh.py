@@ -0,0 +1,226 @@
+import json, urllib.request
+import pytest
+from sqlalchemy import func, select
+from api.db.database import Base, PrimarySessionLocal, get_db_engine
+from api.utils import country_tools
+from api.utils.aggregates import read_total
+from api.utils.country_tools import refresh_countries_data
+from api.utils.upstream import snapshot_key
+from api.v1.models.country_data import CountryData
+from api.v1.models.exchange_rate_history import ExchangeRateHistory
+from api.v1.routes.country_information import delete_country
+
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("database", "http_client", "local_cache")]
+
+
+@pytest.fixture
+def upstream(stub_upstream, monkeypatch):
+    """
+    Points the refresh at the stub and records every upstream request as
+    (document, request headers, status code).
+    """
+    base = f"http://127.0.0.1:{stub_upstream.server_address[1]}"
+    monkeypatch.setattr(country_tools, "COUNTRIES_URL", f"{base}/countries")
+    monkeypatch.setattr(country_tools, "EXCHANGE_URL", f"{base}/rates")
+    # The summary image is rendered in a process pool; not under test here
+    monkeypatch.setattr(country_tools, "schedule_summary_render", lambda summary: None)
+
+    calls = []
+
+    def recording(get):
+        async def wrapper(url, headers=None):
+            response = await get(url, headers=headers)
+            calls.append((url.rsplit("/", 1)[-1], dict(headers or {}), response.status_code))
+            return response
+
+        return wrapper
+
+    monkeypatch.setattr(country_tools, "hedged_get", recording(country_tools.hedged_get))
+    monkeypatch.setattr(country_tools, "get_with_retry", recording(country_tools.get_with_retry))
+
+    stub_upstream.base_url = base
+    stub_upstream.calls = calls
+    return stub_upstream
+
+
+def bump(upstream, rates: bool = False):
+    urllib.request.urlopen(upstream.base_url + ("/bump?rates=1" if rates else "/bump")).close()
+
+
+async def refresh(**kwargs) -> dict:
+    async with PrimarySessionLocal() as db:
+        return await refresh_countries_data(db, **kwargs)
+
+
+async def scalar(statement):
+    async with PrimarySessionLocal() as db:
+        return await db.scalar(statement)
+
+
+async def last_refreshed_at():
+    async with PrimarySessionLocal() as db:
+        return (await read_total(db)).last_refreshed_at
+
+
+async def test_first_refresh_inserts_every_row(upstream):
+    result = await refresh()
+
+    assert result["inserted"] == 50
+    assert result["updated"] == result["unchanged"] == 0
+    assert result["upstream_changed"] is True
+    assert await scalar(select(func.count()).select_from(CountryData)) == 50
+    assert await scalar(select(func.count()).select_from(ExchangeRateHistory)) > 0
+
+
+async def test_not_modified_upstream_skips_the_write(upstream):
+    await refresh()
+    before = await last_refreshed_at()
+    upstream.calls.clear()
+
+    result = await refresh()
+
+    # Both documents were asked for conditionally and came back 304
+    assert sorted(name for name, _, _ in upstream.calls) == ["countries", "rates"]
+    assert all(status == 304 for _, _, status in upstream.calls)
+    assert all("If-None-Match" in headers for _, headers, _ in upstream.calls)
+
+    assert result["upstream_changed"] is False
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (0, 0, 50)
+    assert result["seed"] is None
+    assert result["timings"]["transform_ms"] is None
+
+    # The refresh still counts as one for /status and the summary image
+    assert await last_refreshed_at() > before
+
+
+async def test_changed_document_writes_only_changed_rows(upstream):
+    await refresh()
+    bump(upstream)
+
+    result = await refresh()
+
+    assert result["upstream_changed"] is True
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (0, 1, 49)
+
+
+async def test_new_rates_document_is_recorded_in_history(upstream):
+    await refresh()
+    history = await scalar(select(func.count()).select_from(ExchangeRateHistory))
+    bump(upstream, rates=True)
+
+    result = await refresh()
+
+    assert result["upstream_changed"] is True
+    assert await scalar(select(func.count()).select_from(ExchangeRateHistory)) == 2 * history
+
+
+async def test_deleted_country_comes_back_on_the_next_refresh(upstream):
+    await refresh()
+    name = await scalar(select(CountryData.country_name).order_by(CountryData.country_name))
+    async with PrimarySessionLocal() as db:
+        await delete_country(name, db)
+
+    # Upstream is unchanged and answers 304, yet the row must be restored
+    result = await refresh()
+
+    assert result["inserted"] == 1
+    assert result["unchanged"] == 49
+    assert await scalar(select(CountryData.country_id).where(CountryData.country_name == name))
+
+
+async def test_reset_database_is_repopulated_from_unchanged_upstream(upstream):
+    await refresh()
+    Base.metadata.drop_all(get_db_engine())
+    Base.metadata.create_all(get_db_engine())
+
+    result = await refresh()
+
+    assert result["inserted"] == 50
+    assert await scalar(select(func.count()).select_from(CountryData)) == 50
+
+
+@pytest.mark.upstream(rates_ttl=3600)
+async def test_rates_are_not_fetched_before_their_next_update(upstream):
+    await refresh()
+    name = await scalar(select(CountryData.country_name).order_by(CountryData.country_name))
+    async with PrimarySessionLocal() as db:
+        await delete_country(name, db)
+    upstream.calls.clear()
+
+    result = await refresh()
+
+    # time_next_update_unix is an hour away, so only the countries are asked for
+    assert [name for name, _, _ in upstream.calls] == ["countries"]
+    # and the stored rates snapshot still restores the deleted row
+    assert result["inserted"] == 1
+
+
+async def test_lost_snapshot_is_fetched_without_stale_validators(upstream, local_cache):
+    await refresh()
+    local_cache.path_for(snapshot_key("countries")).unlink()
+    upstream.calls.clear()
+
+    result = await refresh()
+
+    countries_calls = [call for call in upstream.calls if call[0] == "countries"]
+    # Validators without the body they describe must not be sent
+    assert countries_calls == [("countries", {}, 200)]
+    # The body is the one already applied, so nothing is rewritten
+    assert (result["inserted"], result["updated"]) == (0, 0)
+    assert await local_cache.exists(snapshot_key("countries"))
+
+
+async def test_unreachable_upstream_falls_back_to_the_snapshots(upstream):
+    await refresh()
+    upstream.shutdown()
+    upstream.server_close()
+
+    result = await refresh()
+
+    assert sorted(result["stale_sources"]) == ["countries", "rates"]
+    assert result["upstream_changed"] is False
+    assert await scalar(select(func.count()).select_from(CountryData)) == 50
+
+
+async def test_unreachable_upstream_without_snapshot_fails(upstream):
+    upstream.shutdown()
+    upstream.server_close()
+
+    with pytest.raises(Exception) as error:
+        await refresh()
+
+    assert getattr(error.value, "status_code", None) == 503
+
+
+async def estimates() -> dict:
+    async with PrimarySessionLocal() as db:
+        result = await db.execute(select(CountryData.name_key, CountryData.estimated_gdp))
+        return dict(result.all())
+
+
+async def test_explicit_seed_rewrites_every_estimate(upstream):
+    await refresh(seed=5)
+    first = await estimates()
+    await refresh(seed=6)
+    assert await estimates() != first
+
+    # Upstream is unchanged (304), but the seed still forces the rewrite
+    result = await refresh(seed=5)
+
+    assert result["seed"] == 5
+    assert result["updated"] > 0
+    assert await estimates() == first
+
+
+async def test_returned_seed_reproduces_a_run(upstream):
+    result = await refresh()
+    first = await estimates()
+    bump(upstream)
+    await refresh()
+
+    await refresh(seed=result["seed"])
+
+    # Only the bumped country's population differs from the first run
+    replayed = await estimates()
+    assert sum(replayed[key] != first[key] for key in first) <= 1
@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from api.db import database
+from api.db.database import Base, Replica, RoutingSession, check_replicas
+from api.v1.models.system_meta import SystemMeta
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def engines(tmp_path, monkeypatch):
+    """
+    A primary and one replica, each its own SQLite file marked with its
+    name, at cache generations 5 and 4. The worker has seen generation 4.
+    """
+    built = {}
+    for name, generation in (("primary", 5), ("replica0", 4)):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all, tables=[SystemMeta.__table__])
+            await connection.execute(
+                SystemMeta.__table__.insert(),
+                [{"key": "server", "value": name}, {"key": "cache_generation", "value": str(generation)}],
+            )
+        built[name] = engine
+
+    replica = Replica("replica0", built["replica0"])
+    monkeypatch.setattr(database, "get_replicas", lambda: (replica,))
+    monkeypatch.setattr(database, "_known_generation", 4)
+    await check_replicas()
+    yield built["primary"], replica
+    for engine in built.values():
+        await engine.dispose()
+
+
+def session(primary) -> AsyncSession:
+    return AsyncSession(bind=primary, sync_session_class=RoutingSession, autoflush=False)
+
+
+async def server(db: AsyncSession, **bind_arguments) -> str:
+    statement = select(SystemMeta.value).where(SystemMeta.key == "server")
+    return (await db.execute(statement, bind_arguments=bind_arguments)).scalar_one()
+
+
+async def test_reads_go_to_a_replica_at_the_known_generation(engines):
+    primary, replica = engines
+
+    assert replica.generation == 4
+    async with session(primary) as db:
+        assert await server(db) == "replica0"
+
+
+async def test_replica_behind_the_known_generation_gets_no_reads(engines):
+    primary, _ = engines
+    # e.g. this worker just committed generation 5 on the primary
+    database.note_generation(5)
+
+    async with session(primary) as db:
+        assert await server(db) == "primary"
+
+
+async def test_session_stays_on_the_primary_after_a_write(engines):
+    primary, _ = engines
+
+    async with session(primary) as db:
+        db.add(SystemMeta(key="written", value="1"))
+        await db.flush()
+
+        # Reads its own write, which the replica does not have
+        assert await db.scalar(select(SystemMeta.value).where(SystemMeta.key == "written")) == "1"
+        assert await server(db) == "primary"
+
+
+async def test_use_primary_forces_a_read_onto_the_primary(engines):
+    primary, _ = engines
+
+    async with session(primary) as db:
+        assert await server(db, use_primary=True) == "primary"
+        # Only that statement; the session itself is not pinned
+        assert await server(db) == "replica0"
@@ -0,0 +1,54 @@
+import pytest
+from api.db import database
+from api.utils import response_cache as cache_module
+from api.utils.response_cache import CachedResponse, ResponseCache, encoded_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def known_generation(monkeypatch):
+    # observe_generation() also records the generation for replica routing
+    monkeypatch.setattr(database, "_known_generation", None)
+
+
+@pytest.fixture
+def compressions(monkeypatch):
+    # precompressed flag of every compress() call
+    calls = []
+
+    def compress(data, encoding, precompressed=False):
+        calls.append(precompressed)
+        return data
+
+    monkeypatch.setattr(cache_module, "compress", compress)
+    return calls
+
+
+def test_bodies_over_the_entry_limit_are_not_stored(monkeypatch):
+    monkeypatch.setattr(cache_module, "RESPONSE_CACHE_MAX_ENTRY_BYTES", 4)
+    cache = ResponseCache(max_entries=8, ttl_seconds=60, poll_seconds=1)
+    cache.observe_generation(1)
+
+    assert cache.set("/countries?", b"12345", "application/json", 1) is None
+    assert cache.get("/countries?") is None
+
+
+async def test_cached_entry_is_precompressed_once(compressions):
+    cache = ResponseCache(max_entries=8, ttl_seconds=60, poll_seconds=1)
+    cache.observe_generation(1)
+    entry = cache.set("/countries?", b"[]", "application/json", 1)
+
+    await encoded_body(entry, "gzip")
+    await encoded_body(entry, "gzip")
+
+    assert compressions == [True]
+
+
+async def test_uncached_entry_is_compressed_at_dynamic_levels(compressions):
+    entry = CachedResponse(b"[]", "application/json", 1, 0.0, cached=False)
+
+    await encoded_body(entry, "gzip")
+
+    assert compressions == [False]
@@ -0,0 +1,44 @@
+import pytest
+from fastapi import HTTPException
+from api.utils.country_query import COUNTRY_FIELDS, encode_cursor
+from api.utils.country_snapshot import CountrySnapshot
+from api.utils.normalize import normalize_name
+
+
+def record(country_id: str, name: str, gdp=None) -> tuple:
+    values = dict.fromkeys(COUNTRY_FIELDS)
+    values.update(id=country_id, name=name, estimated_gdp=gdp)
+    return (normalize_name(name), *values.values())
+
+
+SNAPSHOT = CountrySnapshot(
+    [record("1", "zambia", 3.0), record("2", "Åland Islands", 1.0), record("3", "Belgium", 2.0)]
+)
+
+
+def names(positions) -> list[str]:
+    return [SNAPSHOT.rows[p]["name"] for p in positions]
+
+
+def test_names_sort_ignoring_case_and_accents():
+    positions, _ = SNAPSHOT.query()
+
+    assert names(positions) == ["Åland Islands", "Belgium", "zambia"]
+
+
+def test_name_cursor_continues_after_the_last_row():
+    first, cursor = SNAPSHOT.query(limit=1)
+    rest, _ = SNAPSHOT.query(cursor=cursor)
+
+    assert names(first + rest) == ["Åland Islands", "Belgium", "zambia"]
+
+
+@pytest.mark.parametrize(
+    "sort_name, key_value, country_id",
+    [("name", 1.5, "1"), ("gdp_asc", "Belgium", "1"), ("gdp_desc", True, "1"), ("name", "belgium", 3)],
+)
+def test_cursor_with_wrong_types_is_rejected(sort_name, key_value, country_id):
+    with pytest.raises(HTTPException) as error:
+        SNAPSHOT.query(sort_name=sort_name, cursor=encode_cursor(sort_name, key_value, country_id))
+
+    assert error.value.status_code == 400
@@ -0,0 +1,159 @@
+import asyncio
+from collections import OrderedDict
+import pytest
+from api.core.base.storage import Storage
+from api.utils import storage as storage_module
+from api.utils.storage import LocalStorage, drain_replication, replicate_in_background
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_put_then_get_returns_the_bytes(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    await storage.put("summary/abc.png", b"image bytes", "image/png")
+
+    assert await storage.get("summary/abc.png") == b"image bytes"
+    assert (tmp_path / "summary" / "abc.png").read_bytes() == b"image bytes"
+
+
+async def test_put_overwrites_and_leaves_no_temporary_files(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    await storage.put("summary/latest", b"first")
+    await storage.put("summary/latest", b"second")
+
+    assert await storage.get("summary/latest") == b"second"
+    assert [p.name for p in (tmp_path / "summary").iterdir()] == ["latest"]
+
+
+async def test_get_and_exists_for_a_missing_key(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    assert await storage.get("summary/missing.png") is None
+    assert await storage.exists("summary/missing.png") is False
+
+
+async def test_exists_after_put(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    await storage.put("flags/originals/abc", b"png")
+
+    assert await storage.exists("flags/originals/abc") is True
+    # Directories are not objects
+    assert await storage.exists("flags/originals") is False
+
+
+async def test_keys_cannot_escape_the_root(tmp_path):
+    storage = LocalStorage(tmp_path / "cache")
+
+    with pytest.raises(ValueError):
+        await storage.put("../outside", b"data")
+    assert not (tmp_path / "outside").exists()
+
+
+class MemoryBucket(Storage):
+    """
+    In-memory replica that records every put and can be made to fail
+    or to hold its uploads until released.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.failures = 0
+        self.release = None
+
+    async def put(self, key, data, content_type=None):
+        self.puts.append(key)
+        if self.release is not None:
+            await self.release.wait()
+        if self.failures:
+            self.failures -= 1
+            raise OSError("bucket unavailable")
+        self.objects[key] = data
+
+    async def get(self, key):
+        return self.objects.get(key)
+
+    async def exists(self, key):
+        return key in self.objects
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = MemoryBucket()
+    monkeypatch.setattr(storage_module, "get_replica_storage", lambda: bucket)
+    monkeypatch.setattr(storage_module, "_replicated", OrderedDict())
+    monkeypatch.setattr(storage_module, "_replication_tasks", set())
+    monkeypatch.setattr(storage_module, "_upload_slots", None)
+    monkeypatch.setattr(storage_module, "UPLOAD_BACKOFF_SECONDS", 0)
+    return bucket
+
+
+async def test_unchanged_bytes_are_replicated_once(bucket):
+    replicate_in_background("summary/latest", b"first")
+    await drain_replication()
+    assert replicate_in_background("summary/latest", b"first") is None
+
+    replicate_in_background("summary/latest", b"second")
+    await drain_replication()
+
+    assert bucket.puts == ["summary/latest", "summary/latest"]
+    assert bucket.objects["summary/latest"] == b"second"
+
+
+async def test_content_addressed_object_already_in_the_bucket_is_skipped(bucket):
+    bucket.objects["summary/abc.png"] = b"png"
+
+    replicate_in_background("summary/abc.png", b"png", content_addressed=True)
+    await drain_replication()
+
+    assert bucket.puts == []
+
+
+async def test_failed_upload_is_sent_again_next_time(bucket, monkeypatch):
+    monkeypatch.setattr(storage_module, "UPLOAD_RETRIES", 2)
+    bucket.failures = 2
+
+    replicate_in_background("summary/latest", b"data")
+    await drain_replication()
+    assert "summary/latest" not in bucket.objects
+
+    # The failed digest was forgotten, so the same bytes are not skipped
+    replicate_in_background("summary/latest", b"data")
+    await drain_replication()
+
+    assert bucket.objects["summary/latest"] == b"data"
+    assert len(bucket.puts) == 3
+
+
+async def test_uploads_beyond_the_queue_limit_are_dropped(bucket, monkeypatch):
+    monkeypatch.setattr(storage_module, "UPLOAD_QUEUE_MAX", 1)
+    bucket.release = asyncio.Event()
+
+    assert replicate_in_background("first", b"1") is not None
+    assert replicate_in_background("second", b"2") is None
+
+    bucket.release.set()
+    await drain_replication()
+    # Dropped without being remembered, so it is sent once there is room
+    replicate_in_background("second", b"2")
+    await drain_replication()
+
+    assert bucket.objects == {"first": b"1", "second": b"2"}
+
+
+async def test_remembered_digests_are_bounded(bucket, monkeypatch):
+    monkeypatch.setattr(storage_module, "REPLICATED_KEYS_MAX", 2)
+
+    for key in ("a", "b", "a", "c"):
+        replicate_in_background(key, b"data")
+        await drain_replication()
+
+    # "b" was the least recently used key when "c" arrived
+    assert list(storage_module._replicated) == ["a", "c"]
+    replicate_in_background("b", b"data")
+    await drain_replication()
+    assert bucket.puts == ["a", "b", "c", "b"]